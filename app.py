@@ -2,9 +2,50 @@
 app.py
 The main FastAPI application for the project. Here, the FastAPI instance is created.
 """
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from routers.api_v1 import api_v1_router
+from db import engine
+from revocation import deny_list
+from events import hub
+from crud.users import resume_pending_purges
+from crud.tasks import run_archiver
+from crud.warmup import warm_up_pool
+from responses import CompressionMiddleware
+from idempotency import idempotency_store
+from health import prober
+from settings import revocation_refresh_seconds, purge_batch_size, archive_after_days, \
+    archive_batch_size, archive_interval_seconds, event_backend, compression_minimum_size, \
+    idempotency_purge_seconds, db_warm_connections, health_probe_seconds
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Warms up the connection pool and starts the background jobs of each worker.
+    On shutdown (once the server has drained the in-flight requests), the jobs
+    are stopped and the pooled connections closed.
+    """
+    await warm_up_pool(engine, db_warm_connections)
+    jobs = [
+        asyncio.create_task(deny_list.run(engine, revocation_refresh_seconds)),
+        asyncio.create_task(resume_pending_purges(engine, purge_batch_size)),
+        asyncio.create_task(run_archiver(engine, archive_interval_seconds,
+                                         archive_after_days * 86400, archive_batch_size)),
+        asyncio.create_task(idempotency_store.run(engine, idempotency_purge_seconds)),
+        asyncio.create_task(prober.run(engine, health_probe_seconds)),
+    ]
+    if event_backend == 'postgres':
+        jobs.append(asyncio.create_task(hub.listen(engine)))
+    yield
+    for job in jobs:
+        job.cancel()
+    await asyncio.gather(*jobs, return_exceptions=True)
+    await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware, minimum_size=compression_minimum_size)
 
 app.include_router(api_v1_router, prefix="/api/v1")
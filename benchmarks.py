@@ -0,0 +1,138 @@
+"""
+benchmarks.py
+Micro-benchmarks for the hot paths of the API, run without a server or DB.
+
+"encoding" compares the cost per item of encoding a list of todos to JSON bytes:
+FastAPI's generic "jsonable_encoder" walk (untyped endpoints), FastAPI's
+response model serialization, and the pydantic-core path of responses.typed_json.
+
+"statements" compares the Python overhead per query of getting the SQL of a
+statement, as SQLAlchemy does on every execution (building the statement, and
+looking it up in the compiled cache): built on each call, as a lambda statement,
+or prebuilt once in crud.statements.
+
+Usage:
+    python benchmarks.py [encoding|statements|all] [--items 10000] [--repeat 5]
+"""
+import argparse
+import json
+import timeit
+import sqlalchemy as sa
+from fastapi.encoders import jsonable_encoder
+from fastapi.utils import create_response_field
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+from crud.statements import OWN_TASK_BY_ID
+from models import Todo
+from schemas import TodoRead, TODO_LIST
+from responses import typed_json
+
+
+def sample_todos(count: int) -> list[dict]:
+    """
+    Function to build a list of todos shaped like the result of get_all_todo_tasks.
+    """
+    return [
+        {
+            "id": index,
+            "title": f"Task {index}",
+            "description": f"Description of task {index}",
+            "is_finished": index % 2 == 0,
+            "creation_date": 1_700_000_000 + index
+        }
+        for index in range(count)
+    ]
+
+
+def dump_json(content) -> bytes:
+    """
+    Function to encode content the way FastAPI's JSONResponse does.
+    """
+    return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def encoding_benchmarks(items: int) -> dict:
+    """
+    Function to get the candidates of the "encoding" benchmark, each encoding "items" todos.
+    """
+    todos = sample_todos(items)
+    field = create_response_field(name="response", type_=list[TodoRead])
+
+    def response_model():
+        value, _ = field.validate(todos, {}, loc=("response",))
+        return dump_json(field.serialize(value, mode="json"))
+
+    return {
+        "jsonable_encoder": lambda: dump_json(jsonable_encoder(todos)),
+        "response_model": response_model,
+        "typed_json": lambda: typed_json(TODO_LIST, todos).body,
+    }
+
+
+def statement_benchmarks(items: int) -> dict:
+    """
+    Function to get the candidates of the "statements" benchmark, each getting
+    the SQL of "items" lookups of a task by ID and owner (as get_accessible_task does).
+    """
+    dialect = asyncpg_dialect()
+    compiled_cache = {}
+
+    def get_sql(statement):
+        # What Connection.execute does before sending the statement to the driver.
+        return statement._compile_w_cache(  # pylint: disable=W0212
+            dialect, compiled_cache=compiled_cache, column_keys=[]
+        )[0]
+
+    def built_per_call():
+        for task_id in range(items):
+            get_sql(sa.select(Todo).where(Todo.id == task_id, Todo.user_id == 1))
+
+    def lambda_statement():
+        for task_id in range(items):
+            get_sql(sa.lambda_stmt(
+                lambda: sa.select(Todo).where(Todo.id == task_id,  # pylint: disable=W0640
+                                              Todo.user_id == 1)
+            ))
+
+    def prebuilt():
+        for _ in range(items):
+            get_sql(OWN_TASK_BY_ID[Todo])
+
+    return {
+        "built_per_call": built_per_call,
+        "lambda_stmt": lambda_statement,
+        "prebuilt": prebuilt,
+    }
+
+
+BENCHMARKS = {
+    "encoding": (encoding_benchmarks, "item"),
+    "statements": (statement_benchmarks, "query"),
+}
+
+
+def run(benchmark: str, items: int, repeat: int) -> dict:
+    """
+    Function to time every candidate of the benchmark, keeping the best of "repeat" runs.
+
+    Returns:
+        The microseconds spent per item (or query) by each candidate.
+    """
+    candidates, _ = BENCHMARKS[benchmark]
+    results = {}
+    for name, candidate in candidates(items).items():
+        best = min(timeit.repeat(candidate, number=1, repeat=repeat))
+        results[name] = best / items * 1_000_000
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the hot paths of the API.")
+    parser.add_argument("benchmark", nargs="?", choices=[*BENCHMARKS, "all"], default="all")
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for selected in BENCHMARKS if args.benchmark == "all" else [args.benchmark]:
+        unit = BENCHMARKS[selected][1]
+        for candidate_name, per_item in run(selected, args.items, args.repeat).items():
+            print(f"{selected} / {candidate_name}: {per_item:.2f} us/{unit}")
@@ -0,0 +1,76 @@
+"""
+batch.py
+This module runs the operations of a batch request against the functions of
+crud.tasks, sharing one DB session (and optionally one transaction).
+"""
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from crud.tasks import create_todo_task, update_todo_task, get_todo_task_by_id, \
+    delete_todo_task, mark_todo_task_completed
+from events import hub
+from schemas import BatchOperation, BatchRequest
+
+NOT_EXECUTED = 'Not executed, an earlier operation of the atomic batch failed.'
+
+
+async def run_operation(operation: BatchOperation, user_id, user_role, db: AsyncSession):
+    """
+    Function to run a single operation of the batch.
+
+    Returns:
+        The status code and body of the operation, as the equivalent endpoint would.
+    """
+    task_id = operation.task_id
+    if operation.op == 'create':
+        return 201, await create_todo_task(todo=operation.todo.model_dump(),
+                                           user_id=user_id, db=db)
+    if operation.op == 'update':
+        return 200, await update_todo_task(task_id=task_id, user_id=user_id, user_role=user_role,
+                                           todo=operation.todo.model_dump(), db=db)
+    if operation.op == 'finish':
+        return 200, await mark_todo_task_completed(task_id=task_id, user_id=user_id,
+                                                   user_role=user_role,
+                                                   finished=operation.is_finished, db=db)
+    if operation.op == 'delete':
+        return 200, await delete_todo_task(task_id=task_id, user_id=user_id,
+                                           user_role=user_role, db=db)
+    return 200, await get_todo_task_by_id(task_id=task_id, user_id=user_id,
+                                          user_role=user_role, db=db)
+
+
+async def run_batch(batch: BatchRequest, user_id, user_role, db: AsyncSession):
+    """
+    Function to run every operation of the batch in order. A failed operation
+    is rolled back on its own, unless the batch is atomic: then the whole batch
+    is rolled back and the remaining operations are not executed.
+
+    Returns:
+        Whether the changes were committed and the result of each operation.
+    """
+    db.info.update({'batch': True, 'atomic': batch.atomic})
+    results = []
+    failed = False
+    try:
+        for operation in batch.operations:
+            if failed:
+                results.append({'status_code': 424, 'body': {'detail': NOT_EXECUTED}})
+                continue
+            try:
+                status_code, body = await run_operation(operation, user_id, user_role, db)
+            except HTTPException as error:
+                # Some informative responses (e.g. an empty list) are raised with a 200.
+                status_code, body = error.status_code, {'detail': error.detail}
+                if status_code >= 400:
+                    await db.rollback()
+                    failed = batch.atomic
+            results.append({'status_code': status_code, 'body': body})
+
+        if batch.atomic and not failed:
+            await db.commit()
+            for event in db.info.get('events', []):
+                hub.publish(event)
+    finally:
+        db.info.clear()
+        await db.close()
+
+    return {'committed': not failed, 'results': results}
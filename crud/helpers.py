@@ -7,6 +7,8 @@ from datetime import datetime
 from functools import wraps
 from fastapi import HTTPException
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from events import hub
 
 
 def get_creation_date():
@@ -42,6 +44,23 @@ def handle_errors(func):
                 detail='An internal server error occurred. Please try again later.'
             ) from error
         finally:
-            await db.close()
+            # A batch keeps using the same session for its next operations.
+            if not db.info.get('batch'):
+                await db.close()
 
     return wrapper
+
+
+async def commit(db: AsyncSession, *events):
+    """
+    Function to commit the session and then publish the task events. When the
+    session runs a batch in a single transaction, the changes are only flushed
+    and the events kept until the batch itself commits.
+    """
+    if db.info.get('atomic'):
+        await db.flush()
+        db.info.setdefault('events', []).extend(events)
+        return
+    await db.commit()
+    for event in events:
+        hub.publish(event)
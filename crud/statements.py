@@ -0,0 +1,113 @@
+"""
+statements.py
+This module builds the SQL statements of the crud functions once, at import,
+with bound parameters for every value. Calls then only pass their parameters:
+SQLAlchemy finds the compiled SQL in its cache without building the statement
+again, and the SQL text is always the same, so asyncpg reuses its prepared statement.
+"""
+import sqlalchemy as sa
+from models import Todo, TodoArchive, TodoTombstone, User, UserDeletion, REVISION_SEQUENCE
+
+TASK_FIELDS = ('id', 'title', 'description', 'is_finished', 'creation_date')
+
+SCHEMA_VERSION = sa.text("SELECT version_num FROM alembic_version")
+
+
+def task_list(model, owned: bool):
+    """
+    Function to build the query listing the tasks of the "todos" or "todos_archive"
+    table, either all of them or those of the ":user_id" user.
+    """
+    query = sa.select(*(getattr(model, field) for field in TASK_FIELDS))
+    if owned:
+        query = query.where(model.user_id == sa.bindparam('user_id'))
+    return query
+
+
+# Keyed by (owned, include_archived).
+TASK_LISTS = {
+    (owned, include_archived): (
+        sa.union_all(task_list(Todo, owned), task_list(TodoArchive, owned))
+        if include_archived else task_list(Todo, owned)
+    )
+    for owned in (True, False)
+    for include_archived in (True, False)
+}
+
+TASK_BY_ID = {model: sa.select(model).where(model.id == sa.bindparam('task_id'))
+              for model in (Todo, TodoArchive)}
+OWN_TASK_BY_ID = {model: query.where(model.user_id == sa.bindparam('user_id'))
+                  for model, query in TASK_BY_ID.items()}
+
+# The loaded task is expired by the caller instead of evaluating the change in Python.
+UPDATE_TASK = (
+    sa.update(Todo)
+    .where(Todo.user_id == sa.bindparam('owner_id'), Todo.id == sa.bindparam('task_id'))
+    .values(title=sa.bindparam('new_title'), description=sa.bindparam('new_description'),
+            is_finished=sa.bindparam('new_is_finished'), updated_at=sa.bindparam('updated_at'),
+            revision=REVISION_SEQUENCE.next_value())
+    .execution_options(synchronize_session=False)
+)
+FINISH_TASK = (
+    sa.update(Todo)
+    .where(Todo.user_id == sa.bindparam('owner_id'), Todo.id == sa.bindparam('task_id'))
+    .values(is_finished=sa.bindparam('new_is_finished'), updated_at=sa.bindparam('updated_at'),
+            revision=REVISION_SEQUENCE.next_value())
+    .execution_options(synchronize_session=False)
+)
+
+CHANGED_TASKS = (
+    sa.select(*(getattr(Todo, field) for field in TASK_FIELDS), Todo.updated_at, Todo.revision)
+    .where(Todo.user_id == sa.bindparam('user_id'), Todo.revision > sa.bindparam('since'))
+    .order_by(Todo.revision).limit(sa.bindparam('limit'))
+)
+DELETED_TASKS = (
+    sa.select(TodoTombstone.id, TodoTombstone.revision)
+    .where(TodoTombstone.user_id == sa.bindparam('user_id'),
+           TodoTombstone.revision > sa.bindparam('since'))
+    .order_by(TodoTombstone.revision).limit(sa.bindparam('limit'))
+)
+
+# Moves a batch of ":batch_size" finished tasks created before ":finished_before"
+# to "todos_archive", with a single DELETE ... RETURNING feeding an INSERT.
+ARCHIVE_CANDIDATES = (
+    sa.select(Todo.user_id, Todo.id)
+    .where(Todo.is_finished, Todo.creation_date <= sa.bindparam('finished_before'))
+    .limit(sa.bindparam('batch_size')).with_for_update(skip_locked=True)
+)
+ARCHIVED_TASKS = (
+    sa.delete(Todo)
+    .where(sa.tuple_(Todo.user_id, Todo.id).in_(ARCHIVE_CANDIDATES))
+    .returning(*(getattr(Todo, field) for field in TASK_FIELDS), Todo.user_id)
+    .cte("moved")
+)
+ARCHIVE_TASKS = sa.insert(TodoArchive).from_select(
+    [*TASK_FIELDS, 'user_id', 'archived_at'],
+    sa.select(*(ARCHIVED_TASKS.c[field] for field in (*TASK_FIELDS, 'user_id')),
+              sa.bindparam('archived_at'))
+)
+
+# SQLite has no DELETE in a WITH clause: the candidates are selected first, then
+# copied and deleted by ":ids" (unique there, as "id" is the rowid).
+SQLITE_ARCHIVE_COPY = sa.insert(TodoArchive).from_select(
+    [*TASK_FIELDS, 'user_id', 'archived_at'],
+    sa.select(*(getattr(Todo, field) for field in TASK_FIELDS), Todo.user_id,
+              sa.bindparam('archived_at'))
+    .where(Todo.id.in_(sa.bindparam('ids', expanding=True)))
+)
+SQLITE_ARCHIVE_DELETE = sa.delete(Todo).where(Todo.id.in_(sa.bindparam('ids', expanding=True)))
+
+USER_BY_ID = sa.select(User).where(User.id == sa.bindparam('uid'))
+ACTIVE_USER_BY_ID = USER_BY_ID.where(User.deleted_at.is_(None))
+ACTIVE_USER_BY_USERNAME = sa.select(User).where(User.username == sa.bindparam('username'),
+                                                User.deleted_at.is_(None))
+USER_BY_USERNAME_OR_EMAIL = sa.select(User).where(
+    sa.or_(User.username == sa.bindparam('username'), User.email == sa.bindparam('email'))
+)
+ALL_USERS = sa.select(User)
+
+DELETION_BY_USER = sa.select(UserDeletion).where(UserDeletion.user_id == sa.bindparam('uid'))
+TODO_COUNT_BY_USER = (
+    sa.select(sa.func.count()).select_from(Todo)  # pylint: disable=E1102
+    .where(Todo.user_id == sa.bindparam('uid'))
+)
@@ -3,12 +3,18 @@ crud.py
 This module handles all the functions called by the app.py module, 
 as well as managing the functionality of the DB operations.
 """
-import sqlalchemy as sa
+import asyncio
+import logging
 from fastapi import HTTPException
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
-from sqlalchemy import text
-from models import Todo
-from crud.helpers import handle_errors, get_creation_date
+from models import Todo, TodoArchive, TodoTombstone
+from crud.helpers import handle_errors, get_creation_date, commit
+from crud.statements import SCHEMA_VERSION, TASK_LISTS, TASK_BY_ID, OWN_TASK_BY_ID, \
+    UPDATE_TASK, FINISH_TASK, CHANGED_TASKS, DELETED_TASKS, ARCHIVE_CANDIDATES, ARCHIVE_TASKS, \
+    SQLITE_ARCHIVE_COPY, SQLITE_ARCHIVE_DELETE
+from dialects import is_sqlite
+from events import task_event, broadcast
 
 NO_ACCESS = 'You do not have permission to access this task.'
 
@@ -33,12 +39,35 @@ async def get_schema(db: AsyncSession):
     Returns:
         A string from the Alembic_version table.
     """
-    query = text("SELECT version_num FROM alembic_version;")
-    result = await db.execute(query)
+    result = await db.execute(SCHEMA_VERSION)
     version_num = result.scalar()
     return version_num
 
 
+async def get_accessible_task(task_id, user_id, user_role, db: AsyncSession, model=Todo):
+    """
+    Function to get a task that the user is allowed to access. For regular users
+    the lookup includes their "user_id", so Postgres only searches their partition
+    of the "todos" table; the unscoped lookup is only needed for admins and to tell
+    a missing task from someone else's.
+
+    Returns:
+        The task, or None if it does not exist.
+    """
+    if user_role != 'admin':
+        result = await db.execute(OWN_TASK_BY_ID[model], {'task_id': task_id, 'user_id': user_id})
+        todo = result.scalar()
+        if todo is not None:
+            return todo
+
+    result = await db.execute(TASK_BY_ID[model], {'task_id': task_id})
+    todo = result.scalar()
+    if todo is not None and user_role != 'admin':
+        raise HTTPException(status_code=403,
+                            detail=NO_ACCESS)
+    return todo
+
+
 @handle_errors
 async def create_todo_task(todo: dict, user_id, db: AsyncSession):
     """
@@ -50,13 +79,15 @@ async def create_todo_task(todo: dict, user_id, db: AsyncSession):
     creation_date = get_creation_date()
     todo.update({"user_id": user_id})
     todo.update({"creation_date": creation_date})
+    todo.update({"updated_at": creation_date})
 
     new_task = Todo(**todo)
     db.add(new_task)
-    query = sa.select(Todo.id).order_by(Todo.id.desc()).limit(1)
-    result = await db.execute(query)
-    task_id = result.scalar()
-    await db.commit()
+    await db.flush()
+    task_id = new_task.id
+    event = task_event('task.created', user_id, {'id': task_id, **todo})
+    await broadcast(db, event)
+    await commit(db, event)
     return {'task_id': task_id, 'status': 'success',
             'message': f'Task with ID {task_id} added successfully.'}
 
@@ -69,39 +100,37 @@ async def update_todo_task(task_id: int, user_id, user_role, todo: dict, db: Asy
     Returns:
         Status code and message of the transaction.
     """
-    query = sa.select(Todo).where(Todo.id == task_id)
-    result = await db.execute(query)
-    existing_task = result.scalar()
-
+    existing_task = await get_accessible_task(task_id, user_id, user_role, db)
     if existing_task is None:
         raise HTTPException(
             status_code=400, detail=['Unable modify a resource that does not exist.']
         )
-    if existing_task.user_id != user_id and user_role != 'admin':
-        raise HTTPException(status_code=403,
-                            detail=NO_ACCESS)
 
-    updated_task = (sa.update(Todo).where(Todo.id == task_id).values(**todo))
-    await db.execute(updated_task)
+    await db.execute(UPDATE_TASK, {
+        'owner_id': existing_task.user_id, 'task_id': task_id, 'new_title': todo['title'],
+        'new_description': todo['description'], 'new_is_finished': todo['is_finished'],
+        'updated_at': get_creation_date()
+    })
+    event = task_event('task.updated', existing_task.user_id, {'id': task_id, **todo})
+    db.expire(existing_task)
+    await broadcast(db, event)
 
-    await db.commit()
+    await commit(db, event)
     return {'status': 'success', 'message': f'Task {task_id} updated successfully.'}
 
 
 @handle_errors
-async def get_all_todo_tasks(user_id, user_role, db: AsyncSession):
+async def get_all_todo_tasks(user_id, user_role, db: AsyncSession, include_archived: bool = False):
     """
-    Function to get all existing task in the "todos" table.
+    Function to get all existing task in the "todos" table
+    (and in the "todos_archive" table if "include_archived" is set).
     
     Returns:
         A list of all todos. If error, returns status code and error message of the transaction.
     """
-    if user_role == "admin":
-        query = sa.select(Todo)
-    else:
-        query = sa.select(Todo).where(Todo.user_id == user_id)
-    result = await db.execute(query)
-    todos = result.scalars().all()
+    query = TASK_LISTS[(user_role != 'admin', include_archived)]
+    result = await db.execute(query, {'user_id': user_id})
+    todos = result.all()
     if not todos:
         raise HTTPException(status_code=200, detail='The Todo list is empty.')
     formatted_output = [
@@ -117,6 +146,33 @@ async def get_all_todo_tasks(user_id, user_role, db: AsyncSession):
     return formatted_output
 
 
+@handle_errors
+async def get_task_changes(user_id, since: int, limit: int, db: AsyncSession):
+    """
+    Function to get the tasks of the user created, updated or deleted after the
+    "since" cursor, oldest first. Both lookups are range scans on a
+    (user_id, revision) index.
+
+    Returns:
+        The changed tasks, the IDs of the deleted ones and the cursor for the next call.
+    """
+    params = {'user_id': user_id, 'since': since, 'limit': limit + 1}
+    changed = (await db.execute(CHANGED_TASKS, params)).all()
+    deleted = (await db.execute(DELETED_TASKS, params)).all()
+
+    # Only the oldest "limit" changes of both kinds are returned, so the cursor
+    # never skips past a change that was left out.
+    revisions = sorted([row.revision for row in changed] + [row.revision for row in deleted])
+    has_more = len(revisions) > limit
+    cursor = revisions[:limit][-1] if revisions else since
+    return {
+        "changed": [row._asdict() for row in changed if row.revision <= cursor],
+        "deleted": [row.id for row in deleted if row.revision <= cursor],
+        "cursor": cursor,
+        "has_more": has_more
+    }
+
+
 @handle_errors
 async def delete_todo_task(task_id, user_id, user_role, db: AsyncSession):
     """
@@ -125,40 +181,37 @@ async def delete_todo_task(task_id, user_id, user_role, db: AsyncSession):
     Returns:
         Status code and message of the transaction.
     """
-    query = sa.select(Todo).where(Todo.id == task_id)
-    result = await db.execute(query)
-    task_to_delete = result.scalar()
+    task_to_delete = await get_accessible_task(task_id, user_id, user_role, db)
     if not task_to_delete:
         raise HTTPException(status_code=400,
                             detail=f'Task with ID {task_id} does not exist. Can\'t delete')
-    if task_to_delete.user_id != user_id and user_role != 'admin':
-        raise HTTPException(status_code=403,
-                            detail=NO_ACCESS)
 
     await db.delete(task_to_delete)
-    await db.commit()
+    db.add(TodoTombstone(id=task_id, user_id=task_to_delete.user_id,
+                         deleted_at=get_creation_date()))
+    event = task_event('task.deleted', task_to_delete.user_id, {'id': task_id})
+    await broadcast(db, event)
+    await commit(db, event)
     return {'status': 'success', 'message': f'Task {task_id} deleted successfully.'}
 
 
 @handle_errors
-async def get_todo_task_by_id(task_id, user_id, user_role, db: AsyncSession):
+async def get_todo_task_by_id(task_id, user_id, user_role, db: AsyncSession,  # pylint: disable=R0913
+                              include_archived: bool = False):
     """
-    Function to get a "todo" matching the provided ID.
+    Function to get a "todo" matching the provided ID, looking in the
+    "todos_archive" table too if "include_archived" is set.
     
     Returns:
         The task. If error, returns status code and error message of the transaction.
     """
-    query = sa.select(Todo).where(Todo.id == task_id)
-    result = await db.execute(query)
-    todo = result.scalar()
+    todo = await get_accessible_task(task_id, user_id, user_role, db)
+    if todo is None and include_archived:
+        todo = await get_accessible_task(task_id, user_id, user_role, db, model=TodoArchive)
     if todo is None:
         raise HTTPException(status_code=400,
                             detail=f'Task with ID {task_id} does not exist.')
 
-    if todo.user_id != user_id and user_role != 'admin':
-        raise HTTPException(status_code=403,
-                            detail=NO_ACCESS)
-
     formatted_output = [
         {
             "id": todo.id,
@@ -180,9 +233,7 @@ async def mark_todo_task_completed(task_id: int, user_id, user_role,
     Returns:
         Status code and message of the transaction.
     """
-    query = sa.select(Todo).where(Todo.id == task_id)
-    result = await db.execute(query)
-    todo = result.scalar()
+    todo = await get_accessible_task(task_id, user_id, user_role, db)
     if todo is None:
         raise HTTPException(status_code=400,
                             detail=f'Task with ID {task_id} does not exist.')
@@ -192,13 +243,54 @@ async def mark_todo_task_completed(task_id: int, user_id, user_role,
     if not todo.is_finished and not finished:
         raise HTTPException(status_code=200,
                             detail=f'Task with ID {task_id} is already set to pending.')
-    if todo.user_id != user_id and user_role != 'admin':
-        raise HTTPException(status_code=403,
-                            detail=NO_ACCESS)
 
-    completed_task = (
-        sa.update(Todo).where(Todo.id == task_id).values(is_finished=finished)
-    )
-    await db.execute(completed_task)
-    await db.commit()
+    await db.execute(FINISH_TASK, {'owner_id': todo.user_id, 'task_id': task_id,
+                                   'new_is_finished': finished, 'updated_at': get_creation_date()})
+    event = task_event('task.finished', todo.user_id, {'id': task_id, 'is_finished': finished})
+    db.expire(todo)
+    await broadcast(db, event)
+    await commit(db, event)
     return {'status': 'success', 'message': f'Task {task_id} successfully set.'}
+
+
+async def archive_finished_tasks(engine: AsyncEngine, older_than: float, batch_size: int) -> int:
+    """
+    Function to move the finished tasks created more than "older_than" seconds ago
+    from "todos" to "todos_archive", in batches of "batch_size". Each batch is a
+    single DELETE ... RETURNING feeding an INSERT (a SELECT, an INSERT and a DELETE
+    on SQLite), in its own transaction.
+
+    Returns:
+        The number of tasks archived.
+    """
+    now = get_creation_date()
+    params = {'finished_before': now - older_than, 'batch_size': batch_size, 'archived_at': now}
+    archived, batch = 0, batch_size
+    while batch == batch_size:
+        async with engine.begin() as conn:
+            if is_sqlite(conn):
+                result = await conn.execute(ARCHIVE_CANDIDATES, params)
+                ids = [row.id for row in result]
+                if ids:
+                    await conn.execute(SQLITE_ARCHIVE_COPY, {'ids': ids, 'archived_at': now})
+                    await conn.execute(SQLITE_ARCHIVE_DELETE, {'ids': ids})
+                batch = len(ids)
+            else:
+                result = await conn.execute(ARCHIVE_TASKS, params)
+                batch = result.rowcount
+        archived += batch
+    return archived
+
+
+async def run_archiver(engine: AsyncEngine, interval: float, older_than: float, batch_size: int):
+    """
+    Function to archive the old finished tasks every "interval" seconds until cancelled.
+    """
+    while True:
+        try:
+            archived = await archive_finished_tasks(engine, older_than, batch_size)
+            if archived:
+                logging.info("Archived %s finished tasks.", archived)
+        except SQLAlchemyError as error:
+            logging.error("Unable to archive the finished tasks: %s", error)
+        await asyncio.sleep(interval)
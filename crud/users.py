@@ -3,16 +3,20 @@ users.py
 This module handles all the functions called by the app.py module, 
 but focused on user-related DB operations.
 """
+import logging
 import sqlalchemy as sa
 
 from fastapi import HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import or_
-from models import User
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
+from models import User, Todo, TokenRevocation, UserDeletion
 from schemas import UserUpdate, UserRole
 from crypto import verify_password
-from oauth import create_access_token
+from oauth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from revocation import deny_list
 from crud.helpers import handle_errors, get_creation_date
+from crud.statements import USER_BY_ID, ACTIVE_USER_BY_ID, ACTIVE_USER_BY_USERNAME, \
+    USER_BY_USERNAME_OR_EMAIL, ALL_USERS, DELETION_BY_USER, TODO_COUNT_BY_USER
 
 NOT_AUTHORIZED = 'You are not authorized to perform this action.'
 
@@ -30,10 +34,8 @@ async def create_new_user(user_data: dict, db: AsyncSession):
     user_data['role'] = UserRole.USER
     new_user = User(**user_data)
 
-    query = sa.select(User).where(
-        or_(User.username == user_data['username'], User.email == user_data['email'])
-    )
-    result = await db.execute(query)
+    result = await db.execute(USER_BY_USERNAME_OR_EMAIL, {'username': user_data['username'],
+                                                          'email': user_data['email']})
     user_exists = result.scalars().first()
     if user_exists:
         raise HTTPException(status_code=400,
@@ -53,8 +55,7 @@ async def user_login(user_credentials: dict, db: AsyncSession):
     Returns:
         A unique token for the user (if auth is successful). 
     """
-    query = sa.select(User).where(User.username == user_credentials.username)
-    result = await db.execute(query)
+    result = await db.execute(ACTIVE_USER_BY_USERNAME, {'username': user_credentials.username})
     user = result.scalar()
     if user is None:
         raise HTTPException(status_code=403, detail='Invalid credentials.')
@@ -62,7 +63,8 @@ async def user_login(user_credentials: dict, db: AsyncSession):
     if not verify_password(user_credentials.password, user.password):
         raise HTTPException(status_code=403, detail='Invalid credentials.')
 
-    access_token = create_access_token(data={"user_id": user.id, "user_role": user.role})
+    access_token = create_access_token(data={"user_id": user.id, "user_role": user.role,
+                                             "ver": user.token_version})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -74,8 +76,7 @@ async def get_existing_user(uid: int, db: AsyncSession):
     Returns:
         The user info (if it exists). 
     """
-    query = sa.select(User).where(User.id == uid)
-    result = await db.execute(query)
+    result = await db.execute(USER_BY_ID, {'uid': uid})
     existing_user = result.scalar()
     if existing_user is None:
         raise HTTPException(status_code=404,
@@ -93,8 +94,7 @@ async def update_existing_user(uid: int, user_id, user_role,
     Returns:
         The updated user info (if successful). 
     """
-    query = sa.select(User).where(User.id == uid)
-    result = await db.execute(query)
+    result = await db.execute(USER_BY_ID, {'uid': uid})
     modified_user = result.scalar()
     if modified_user is None:
         raise HTTPException(status_code=404,
@@ -103,10 +103,10 @@ async def update_existing_user(uid: int, user_id, user_role,
         raise HTTPException(status_code=403,
                             detail=NOT_AUTHORIZED)
 
-    query_all = await db.execute(sa.select(User))
-    existing = query_all.scalars().all()
-    if any(user_data.username == user.username or
-           user_data.email == user.email for user in existing):
+    # Only the users with the new username or email are loaded (missing values match no one).
+    result = await db.execute(USER_BY_USERNAME_OR_EMAIL, {'username': user_data.username,
+                                                          'email': user_data.email})
+    if result.scalars().first() is not None:
         raise HTTPException(status_code=409,
                             detail='Username or email already in use.')
 
@@ -130,21 +130,99 @@ async def delete_existing_user(uid, user_id, user_role, db: AsyncSession):
     Returns:
         Status code and message of the transaction.
     """
-    query = sa.select(User).where(User.id == uid)
-    result = await db.execute(query)
-    user_to_delete = result.scalar()
-    if not user_to_delete:
-        raise HTTPException(status_code=400,
-                            detail=f'User {uid} does not exist.')
-    if user_to_delete.id != user_id and user_role != 'admin':
-        raise HTTPException(status_code=403,
-                            detail=NOT_AUTHORIZED)
-
+    user_to_delete = await find_user_to_delete(uid, user_id, user_role, db)
     await db.delete(user_to_delete)
     await db.commit()
     return {'status': 'success', 'message': f'User {uid} deleted successfully.'}
 
 
+@handle_errors
+async def mark_user_deleted(uid, user_id, user_role, db: AsyncSession):
+    """
+    Function to mark a user as deleted and revoke their tokens, leaving the
+    removal of their todos to "purge_deleted_user".
+
+    Returns:
+        Status code and message of the transaction.
+    """
+    await find_user_to_delete(uid, user_id, user_role, db)
+    deleted_at = get_creation_date()
+    revocation = await revoke_user_tokens(uid, db, deleted_at=deleted_at)
+    db.add(UserDeletion(user_id=uid, requested_at=deleted_at))
+    await db.commit()
+    deny_list.add(revocation)
+    return {'status': 'accepted', 'message': f'User {uid} scheduled for deletion.'}
+
+
+@handle_errors
+async def get_deletion_status(uid, db: AsyncSession):
+    """
+    Function to report the progress of a background user deletion.
+
+    Returns:
+        The deletion status, including how many todos are left to delete.
+    """
+    result = await db.execute(DELETION_BY_USER, {'uid': uid})
+    deletion = result.scalar()
+    if deletion is None:
+        raise HTTPException(status_code=404,
+                            detail=f'No deletion was requested for user {uid}.')
+    remaining = await db.execute(TODO_COUNT_BY_USER, {'uid': uid})
+    return {
+        "user_id": uid,
+        "status": "in_progress" if deletion.finished_at is None else "completed",
+        "requested_at": deletion.requested_at,
+        "finished_at": deletion.finished_at,
+        "deleted_todos": deletion.deleted_todos,
+        "remaining_todos": remaining.scalar()
+    }
+
+
+async def purge_deleted_user(uid: int, engine: AsyncEngine, batch_size: int):
+    """
+    Function to delete the todos of a user marked as deleted in batches of
+    "batch_size", each in its own short transaction, and then the user itself.
+    Locked rows are skipped so several workers can share the same purge.
+    """
+    batch = (
+        sa.select(Todo.id).where(Todo.user_id == uid)
+        .limit(batch_size).with_for_update(skip_locked=True)
+    )
+    deleted = batch_size
+    try:
+        while deleted == batch_size:
+            async with engine.begin() as conn:
+                result = await conn.execute(sa.delete(Todo).where(Todo.id.in_(batch)))
+                deleted = result.rowcount
+                await conn.execute(
+                    sa.update(UserDeletion).where(UserDeletion.user_id == uid)
+                    .values(deleted_todos=UserDeletion.deleted_todos + deleted)
+                )
+        async with engine.begin() as conn:
+            await conn.execute(sa.delete(User).where(User.id == uid))
+            await conn.execute(
+                sa.update(UserDeletion).where(UserDeletion.user_id == uid)
+                .values(finished_at=get_creation_date())
+            )
+    except SQLAlchemyError as error:
+        logging.error("Unable to purge user %s: %s", uid, error)
+
+
+async def resume_pending_purges(engine: AsyncEngine, batch_size: int):
+    """
+    Function to finish the purges interrupted by a restart.
+    """
+    query = sa.select(UserDeletion.user_id).where(UserDeletion.finished_at.is_(None))
+    try:
+        async with engine.connect() as conn:
+            pending = (await conn.execute(query)).scalars().all()
+    except SQLAlchemyError as error:
+        logging.error("Unable to load the pending user purges: %s", error)
+        return
+    for uid in pending:
+        await purge_deleted_user(uid, engine, batch_size)
+
+
 @handle_errors
 async def get_all_existing_users(user_role, db: AsyncSession):
     """
@@ -155,7 +233,7 @@ async def get_all_existing_users(user_role, db: AsyncSession):
         returns status code and error message of the transaction.
     """
     if user_role == "admin":
-        query = sa.select(User)
+        query = ALL_USERS
     else:
         raise HTTPException(status_code=403,
                             detail=NOT_AUTHORIZED)
@@ -182,8 +260,7 @@ async def set_new_role(uid, new_role, user_role, db: AsyncSession):
     Returns:
         Status code and message of the transaction.
     """
-    query = sa.select(User).where(User.id == uid)
-    result = await db.execute(query)
+    result = await db.execute(USER_BY_ID, {'uid': uid})
     user = result.scalar()
     if user is None:
         raise HTTPException(status_code=400,
@@ -195,10 +272,67 @@ async def set_new_role(uid, new_role, user_role, db: AsyncSession):
         raise HTTPException(status_code=200,
                             detail=f'User already had role {new_role.role}. No changes made.')
 
-    set_role = (
-        sa.update(User).where(User.id == uid).values(role=new_role.role)
-    )
-    await db.execute(set_role)
+    # Tokens issued with the old role are revoked.
+    revocation = await revoke_user_tokens(uid, db, role=new_role.role)
     await db.commit()
+    deny_list.add(revocation)
     return {'status': 'success',
             'message': f'User {uid} successfully changed to {new_role.role}.'}
+
+
+@handle_errors
+async def revoke_access_token(claims: dict, db: AsyncSession):
+    """
+    Function to revoke a single access token before it expires (logout).
+
+    Returns:
+        Status code and message of the transaction.
+    """
+    revocation = TokenRevocation(jti=claims.get('jti'), user_id=claims.get('user_id'),
+                                 expires_at=int(claims.get('exp')))
+    if revocation.jti is None:
+        raise HTTPException(status_code=400,
+                            detail='This token can not be revoked, please log in again.')
+    db.add(revocation)
+    await db.commit()
+    deny_list.add(revocation)
+    return {'status': 'success', 'message': 'Successfully logged out.'}
+
+
+async def find_user_to_delete(uid, user_id, user_role, db: AsyncSession) -> User:
+    """
+    Function to get a user that the current user is allowed to delete.
+
+    Returns:
+        The user to delete.
+    """
+    result = await db.execute(ACTIVE_USER_BY_ID, {'uid': uid})
+    user_to_delete = result.scalar()
+    if not user_to_delete:
+        raise HTTPException(status_code=400,
+                            detail=f'User {uid} does not exist.')
+    if user_to_delete.id != user_id and user_role != 'admin':
+        raise HTTPException(status_code=403,
+                            detail=NOT_AUTHORIZED)
+    return user_to_delete
+
+
+async def revoke_user_tokens(uid, db: AsyncSession, **values) -> TokenRevocation:
+    """
+    Function to revoke every token issued to a user so far, by bumping their
+    token version, while applying any other "values" to the user row.
+
+    Returns:
+        The revocation, to be added to the deny-list once committed.
+    """
+    query = (
+        sa.update(User).where(User.id == uid)
+        .values(token_version=User.token_version + 1, **values)
+        .returning(User.token_version)
+    )
+    result = await db.execute(query)
+    expires_at = get_creation_date() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    revocation = TokenRevocation(user_id=uid, not_before_version=result.scalar(),
+                                 expires_at=expires_at)
+    db.add(revocation)
+    return revocation
@@ -0,0 +1,61 @@
+"""
+warmup.py
+This module opens the pooled DB connections of a worker before it serves
+requests, and primes them by running the read queries of the crud functions.
+"""
+import asyncio
+import logging
+from fastapi import HTTPException
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from sqlalchemy.pool import QueuePool
+from crud.tasks import get_all_todo_tasks, get_todo_task_by_id, get_task_changes
+from crud.users import get_existing_user
+
+# No row has ID 0, so these calls only prepare their statements (and fail with a 4xx).
+PRIMERS = (
+    lambda db: get_all_todo_tasks(user_id=0, user_role='user', db=db),
+    lambda db: get_all_todo_tasks(user_id=0, user_role='user', db=db, include_archived=True),
+    lambda db: get_todo_task_by_id(task_id=0, user_id=0, user_role='user', db=db,
+                                   include_archived=True),
+    lambda db: get_task_changes(user_id=0, since=0, limit=1, db=db),
+    lambda db: get_existing_user(uid=0, db=db),
+)
+
+
+async def prime_statement_cache(conn: AsyncConnection):
+    """
+    Function to run the crud read queries on the connection, so asyncpg has
+    their prepared statements cached (and SQLAlchemy their compiled SQL)
+    before the first request needs them.
+    """
+    db = AsyncSession(bind=conn)
+    for primer in PRIMERS:
+        try:
+            await primer(db)
+        except HTTPException:
+            pass
+
+
+async def warm_up_pool(db_engine: AsyncEngine, connections: int) -> int:
+    """
+    Function to open up to "connections" pooled connections at once and prime each of them.
+
+    Returns:
+        The number of connections left ready in the pool (0 without a pool, as
+        with the single connection of an in-memory SQLite DB).
+    """
+    if not isinstance(db_engine.pool, QueuePool):
+        return 0
+    count = min(connections, db_engine.pool.size())
+    opened = [db_engine.connect() for _ in range(count)]
+    try:
+        await asyncio.gather(*(conn.start() for conn in opened))
+        await asyncio.gather(*(prime_statement_cache(conn) for conn in opened))
+    except (SQLAlchemyError, OSError) as error:
+        logging.error("Unable to warm up the connection pool: %s", error)
+    finally:
+        for conn in opened:
+            if conn.sync_connection is not None:
+                await conn.close()
+    return db_engine.pool.checkedin()
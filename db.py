@@ -2,11 +2,35 @@
 db.py
 The DB module. It creates the engine and sessions for the DB connection.
 """
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from settings import connection_string, test_connection_string
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from dialects import set_sqlite_pragmas
+from settings import connection_string, test_connection_string, db_pool_size, db_max_overflow
 
-engine = create_async_engine(connection_string)
+
+def create_engine(url: str) -> AsyncEngine:
+    """
+    Function to create the engine of a DB. An in-memory SQLite DB only lives as
+    long as its connection, so it keeps the single connection SQLAlchemy gives it.
+
+    Returns:
+        The engine.
+    """
+    if not url.startswith('sqlite'):
+        return create_async_engine(url, pool_size=db_pool_size, max_overflow=db_max_overflow)
+
+    if url.endswith(':memory:'):
+        db_engine = create_async_engine(url)
+    else:
+        db_engine = create_async_engine(url, poolclass=AsyncAdaptedQueuePool,
+                                        pool_size=db_pool_size, max_overflow=db_max_overflow)
+    event.listen(db_engine.sync_engine, 'connect', set_sqlite_pragmas)
+    return db_engine
+
+
+engine = create_engine(connection_string)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
-test_engine = create_async_engine(test_connection_string)
+test_engine = create_engine(test_connection_string)
 test_async_session = async_sessionmaker(test_engine, expire_on_commit=False)
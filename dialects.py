@@ -0,0 +1,76 @@
+"""
+dialects.py
+The parts of the schema and of the queries which differ between the Postgres
+and SQLite backends of the DB (see "db_backend" in settings.py).
+
+SQLite has no sequences, so "todos_revision_seq" is emulated by a one-row table
+holding the last value, advanced by triggers on the tables using it. Migrations
+recreating one of these tables on SQLite (batch mode) have to create its triggers again.
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import next_value
+
+
+def is_sqlite(bind) -> bool:
+    """
+    Function to tell whether an engine or connection uses the SQLite backend.
+    """
+    return bind.dialect.name == 'sqlite'
+
+
+def upsert(bind, table):
+    """
+    Function to start an INSERT ... ON CONFLICT statement on the table, in the
+    dialect of the engine or connection (both support the same options).
+    """
+    return sqlite.insert(table) if is_sqlite(bind) else postgresql.insert(table)
+
+
+@compiles(next_value, 'sqlite')
+def sqlite_next_value(element, compiler, **kw):  # pylint: disable=W0613
+    """
+    Function to compile "sequence.next_value()" for SQLite. The value is only
+    taken by the update trigger of the column it is assigned to.
+    """
+    return f"(SELECT value + 1 FROM {element.sequence.name})"
+
+
+def sqlite_sequence_ddl(sequence: str) -> list[str]:
+    """
+    Function to get the statements creating the table emulating a sequence on SQLite.
+    """
+    return [
+        f"CREATE TABLE {sequence} (id INTEGER PRIMARY KEY CHECK (id = 1), "
+        "value INTEGER NOT NULL)",
+        f"INSERT INTO {sequence} (id, value) VALUES (1, 0)",
+    ]
+
+
+def sqlite_sequence_triggers(sequence: str, table: str, column: str) -> list[str]:
+    """
+    Function to get the statements creating the triggers which give the new rows
+    of the table the next value of the sequence, and keep the sequence past the
+    values assigned by updates (see sqlite_next_value).
+    """
+    return [
+        f"CREATE TRIGGER {table}_{column}_insert AFTER INSERT ON {table} BEGIN "
+        f"UPDATE {sequence} SET value = value + 1; "
+        f"UPDATE {table} SET {column} = (SELECT value FROM {sequence}) "
+        "WHERE rowid = NEW.rowid; END",
+        f"CREATE TRIGGER {table}_{column}_update AFTER UPDATE OF {column} ON {table} BEGIN "
+        f"UPDATE {sequence} SET value = NEW.{column} WHERE value < NEW.{column}; END",
+    ]
+
+
+def set_sqlite_pragmas(dbapi_connection, _connection_record):
+    """
+    Listener for the "connect" event of SQLite engines: foreign keys (and their
+    cascades) are off by default in SQLite, and the write-ahead log lets readers
+    run alongside the writer.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys = ON")
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.close()
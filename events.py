@@ -0,0 +1,117 @@
+"""
+events.py
+In-process pub/sub hub pushing task changes to the clients of each user over
+Server-Sent Events. With the "postgres" event backend, events are also sent with
+NOTIFY so the hubs of the other workers can deliver them to their own clients.
+"""
+import asyncio
+import json
+import logging
+import uuid
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from settings import event_backend
+
+CHANNEL = 'todo_events'
+WORKER_ID = uuid.uuid4().hex
+
+
+class EventHub:
+    """
+    Keeps a bounded queue per connected client, grouped by user ID.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """
+        Function to register a new client of the user.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        """
+        Function to remove a disconnected client.
+        """
+        queues = self.subscribers.get(user_id, set())
+        queues.discard(queue)
+        if not queues:
+            self.subscribers.pop(user_id, None)
+
+    def publish(self, event: dict):
+        """
+        Function to deliver an event to every client of its user connected to
+        this worker. A client too slow to keep up loses its oldest event.
+        """
+        for queue in self.subscribers.get(event['user_id'], ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def on_notification(self, _connection, _pid, _channel, payload: str):
+        """
+        Function to publish the events received from the other workers.
+        """
+        event = json.loads(payload)
+        if event.pop('origin') != WORKER_ID:
+            self.publish(event)
+
+    async def listen(self, engine: AsyncEngine):
+        """
+        Function to relay the events of the other workers until cancelled.
+        """
+        while True:
+            try:
+                async with engine.connect() as conn:
+                    raw_connection = await conn.get_raw_connection()
+                    driver_connection = raw_connection.driver_connection
+                    await driver_connection.add_listener(CHANNEL, self.on_notification)
+                    try:
+                        await asyncio.Future()
+                    finally:
+                        await driver_connection.remove_listener(CHANNEL, self.on_notification)
+            except Exception as error:  # pylint: disable=W0718
+                logging.error("Lost the connection listening to task events: %s", error)
+                await asyncio.sleep(5)
+
+
+hub = EventHub()
+
+
+def task_event(event_type: str, user_id: int, task: dict) -> dict:
+    """
+    Function to build a task event.
+    """
+    return {'type': event_type, 'user_id': user_id, 'task': task}
+
+
+async def broadcast(db: AsyncSession, event: dict):
+    """
+    Function to send the event to the other workers. It is part of the current
+    transaction, so it is only delivered once (and if) the change is committed.
+    """
+    if event_backend == 'postgres':
+        payload = json.dumps({**event, 'origin': WORKER_ID})
+        await db.execute(sa.select(sa.func.pg_notify(CHANNEL, payload)))
+
+
+async def event_stream(user_id: int, heartbeat: float = 15):
+    """
+    Function to generate the Server-Sent Events of the user, with a comment
+    every "heartbeat" seconds to keep idle connections open.
+    """
+    queue = hub.subscribe(user_id)
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event['task'])}\n\n"
+    finally:
+        hub.unsubscribe(user_id, queue)
@@ -0,0 +1,89 @@
+"""
+health.py
+Background prober for the health and readiness endpoints. The DB reachability
+and schema version are checked every few seconds by each worker, and the probes
+are answered from the last result instead of querying the DB on every call.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+import sqlalchemy as sa
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from alembic.util import CommandError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from settings import health_stale_seconds
+
+
+def get_head_revision() -> Optional[str]:
+    """
+    Function to get the latest migration of the project (the schema the code expects).
+    """
+    try:
+        return ScriptDirectory.from_config(Config("alembic.ini")).get_current_head()
+    except CommandError as error:
+        logging.error("Unable to read the migrations: %s", error)
+        return None
+
+
+class HealthProber:
+    """
+    The result of the last probe: whether the DB answered, its schema version,
+    and when it was checked (None until the first probe).
+    """
+
+    def __init__(self, expected_version: Optional[str], stale_after: float):
+        self.expected_version = expected_version
+        self.stale_after = stale_after
+        self.database_ok = False
+        self.schema_version: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.started_at = time.time()
+
+    async def probe(self, engine: AsyncEngine):
+        """
+        Function to check the DB, with a single query for both its reachability
+        and its schema version.
+        """
+        try:
+            async with engine.connect() as conn:
+                result = await conn.execute(sa.text("SELECT version_num FROM alembic_version"))
+                self.schema_version = result.scalar()
+            self.database_ok = True
+        except (SQLAlchemyError, OSError) as error:
+            logging.error("Health probe failed: %s", error)
+            self.database_ok = False
+        self.checked_at = time.time()
+
+    async def run(self, engine: AsyncEngine, interval: float):
+        """
+        Function to keep probing the DB until cancelled.
+        """
+        while True:
+            await self.probe(engine)
+            await asyncio.sleep(interval)
+
+    def status(self) -> dict:
+        """
+        Function to report the last probe. The worker is ready when the DB answered,
+        its schema is up to date, and the probe is not stale.
+        """
+        now = time.time()
+        age = None if self.checked_at is None else now - self.checked_at
+        stale = age is None or age > self.stale_after
+        schema_ok = self.expected_version is None or self.schema_version == self.expected_version
+        return {
+            "ready": self.database_ok and schema_ok and not stale,
+            "database": self.database_ok,
+            "schema_version": self.schema_version,
+            "expected_schema_version": self.expected_version,
+            "checked_at": self.checked_at,
+            "age_seconds": age,
+            "stale": stale,
+            "uptime_seconds": now - self.started_at
+        }
+
+
+prober = HealthProber(get_head_revision(), health_stale_seconds)
@@ -0,0 +1,253 @@
+"""
+idempotency.py
+Support for the "Idempotency-Key" header on the write routes, so clients can
+safely retry requests which timed out. The first response to each key of a user
+is stored (in the "idempotency_keys" table, fronted by an in-memory LRU) and
+sent back to the retries without running the route again.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import NamedTuple, Optional
+from fastapi import Depends, Header, HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+import sqlalchemy as sa
+from dialects import upsert
+from models import IdempotencyKey
+from oauth import get_current_user
+from routers.db_functions import get_engine
+from settings import idempotency_ttl_seconds, idempotency_cache_size
+
+IN_PROGRESS = 'A request with this Idempotency-Key is still being processed.'
+KEY_REUSED = 'This Idempotency-Key was already used for a different request.'
+
+
+class StoredResponse(NamedTuple):
+    """
+    The response to the first request sent with a key.
+    """
+    fingerprint: str
+    status_code: int
+    body: bytes
+    media_type: str
+    expires_at: int
+
+    def replay(self) -> Response:
+        """
+        Function to rebuild the response for a retry.
+        """
+        return Response(self.body, status_code=self.status_code, media_type=self.media_type,
+                        headers={"Idempotent-Replayed": "true"})
+
+
+class Reservation(NamedTuple):
+    """
+    A key claimed by the request currently running it.
+    """
+    user_id: int
+    key: str
+    fingerprint: str
+    engine: AsyncEngine
+
+
+class IdempotentReplay(Exception):
+    """
+    Raised by the dependency to answer a retry with the stored response.
+    """
+
+    def __init__(self, response: Response):
+        super().__init__()
+        self.response = response
+
+
+class IdempotencyStore:
+    """
+    Stored responses, cached in a dict ordered by last use so the least recently
+    used ones can be evicted once "max_keys" is reached.
+    """
+
+    def __init__(self, ttl: int, max_keys: int):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.responses: dict[tuple[int, str], StoredResponse] = {}
+
+    def get(self, user_id: int, key: str) -> Optional[StoredResponse]:
+        """
+        Function to get a cached response which has not expired.
+        """
+        stored = self.responses.pop((user_id, key), None)
+        if stored is None or stored.expires_at <= time.time():
+            return None
+        self.responses[(user_id, key)] = stored
+        return stored
+
+    def put(self, user_id: int, key: str, stored: StoredResponse):
+        """
+        Function to cache a response.
+        """
+        self.responses.pop((user_id, key), None)
+        self.responses[(user_id, key)] = stored
+        if len(self.responses) > self.max_keys:
+            del self.responses[next(iter(self.responses))]
+
+    async def reserve(self, engine: AsyncEngine, user_id: int, key: str,
+                      fingerprint: str) -> Optional[StoredResponse]:
+        """
+        Function to claim the key for the current request. A key whose response
+        has expired is claimed again.
+
+        Returns:
+            None if the key was claimed, otherwise the response stored for it.
+        """
+        now = int(time.time())
+        table = IdempotencyKey.__table__
+        values = {'fingerprint': fingerprint, 'status_code': None, 'body': None,
+                  'media_type': None, 'expires_at': now + self.ttl}
+        query = (
+            upsert(engine, table)
+            .values(user_id=user_id, key=key, **values)
+            .on_conflict_do_update(index_elements=[table.c.user_id, table.c.key], set_=values,
+                                   where=table.c.expires_at <= now)
+            .returning(table.c.key)
+        )
+        async with engine.begin() as conn:
+            result = await conn.execute(query)
+            if result.first() is not None:
+                return None
+            result = await conn.execute(
+                sa.select(table).where(table.c.user_id == user_id, table.c.key == key)
+            )
+            row = result.first()
+
+        if row.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail=KEY_REUSED)
+        if row.status_code is None:
+            raise HTTPException(status_code=409, detail=IN_PROGRESS)
+        stored = StoredResponse(row.fingerprint, row.status_code, row.body,
+                                row.media_type, row.expires_at)
+        self.put(user_id, key, stored)
+        return stored
+
+    async def save(self, reservation: Reservation, status_code: int, body: bytes,
+                   media_type: str):
+        """
+        Function to store the response to a claimed key. Server errors are not
+        stored: the key is released so the request can be retried.
+        """
+        table = IdempotencyKey.__table__
+        where = (table.c.user_id == reservation.user_id, table.c.key == reservation.key)
+        async with reservation.engine.begin() as conn:
+            if status_code >= 500:
+                await conn.execute(sa.delete(table).where(*where))
+                return
+            result = await conn.execute(
+                sa.update(table).where(*where)
+                .values(status_code=status_code, body=body, media_type=media_type)
+                .returning(table.c.expires_at)
+            )
+            expires_at = result.scalar()
+        self.put(reservation.user_id, reservation.key,
+                 StoredResponse(reservation.fingerprint, status_code, body, media_type, expires_at))
+
+    async def purge(self, engine: AsyncEngine):
+        """
+        Function to delete the expired keys.
+        """
+        now = int(time.time())
+        async with engine.begin() as conn:
+            await conn.execute(sa.delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now))
+        self.responses = {entry: stored for entry, stored in self.responses.items()
+                          if stored.expires_at > now}
+
+    async def run(self, engine: AsyncEngine, interval: float):
+        """
+        Function to keep purging the expired keys until cancelled.
+        """
+        while True:
+            try:
+                await self.purge(engine)
+            except SQLAlchemyError as error:
+                logging.error("Unable to purge the expired idempotency keys: %s", error)
+            await asyncio.sleep(interval)
+
+
+idempotency_store = IdempotencyStore(ttl=idempotency_ttl_seconds, max_keys=idempotency_cache_size)
+
+
+async def check_idempotency_key(request: Request,
+                                idempotency_key: Optional[str] = Header(None, max_length=255),
+                                user_data: tuple = Depends(get_current_user),
+                                engine: AsyncEngine = Depends(get_engine)):
+    """
+    Dependency for the write routes: a retry gets the stored response back,
+    a new key is claimed until the route (run by IdempotentRoute) stores its response.
+    """
+    if idempotency_key is None:
+        return
+    user_id, _ = user_data
+    request_line = f"{request.method} {request.url.path}?{request.url.query}\n".encode()
+    fingerprint = hashlib.sha256(request_line + await request.body()).hexdigest()
+
+    stored = idempotency_store.get(user_id, idempotency_key)
+    if stored is None:
+        try:
+            stored = await idempotency_store.reserve(engine, user_id, idempotency_key,
+                                                     fingerprint)
+        except SQLAlchemyError as error:
+            # Better to run the request than to fail every write.
+            logging.error("Idempotency backend unavailable: %s", error)
+            return
+    if stored is None:
+        request.state.idempotency = Reservation(user_id, idempotency_key, fingerprint, engine)
+        return
+    if stored.fingerprint != fingerprint:
+        raise HTTPException(status_code=422, detail=KEY_REUSED)
+    raise IdempotentReplay(stored.replay())
+
+
+IDEMPOTENT = [Depends(check_idempotency_key)]
+
+
+async def store_response(request: Request, status_code: int, body: bytes, media_type: str):
+    """
+    Function to store the response to the key claimed by the request, if any.
+    """
+    reservation = getattr(request.state, 'idempotency', None)
+    if reservation is None:
+        return
+    try:
+        await idempotency_store.save(reservation, status_code, body, media_type)
+    except SQLAlchemyError as error:
+        logging.error("Unable to store the response to an idempotency key: %s", error)
+
+
+class IdempotentRoute(APIRoute):
+    """
+    Route class sending the stored responses to retries and storing the first
+    response to each key claimed by check_idempotency_key.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            try:
+                response = await handler(request)
+            except IdempotentReplay as replay:
+                return replay.response
+            except HTTPException as error:
+                body = json.dumps({'detail': error.detail}).encode()
+                await store_response(request, error.status_code, body, 'application/json')
+                raise
+            except Exception:
+                await store_response(request, 500, b'', '')
+                raise
+            await store_response(request, response.status_code, getattr(response, 'body', b''),
+                                 response.media_type or 'application/json')
+            return response
+
+        return route_handler
@@ -38,7 +38,9 @@ def run_migrations_offline():
         context.run_migrations()
 
 def do_run_migrations(connection):
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # SQLite can only alter most of a table by recreating it ("batch" mode).
+    context.configure(connection=connection, target_metadata=target_metadata,
+                      render_as_batch=connection.dialect.name == 'sqlite')
 
     with context.begin_transaction():
         context.run_migrations()
@@ -50,26 +52,25 @@ async def run_migrations_online():
     and associate a connection with the context.
 
     """
-    connectable_main = create_async_engine(
-        connection_string,
-        future=True,
-        poolclass=pool.NullPool,
-    )
-    connectable_test = create_async_engine(
-        test_connection_string,
-        future=True,
-        poolclass=pool.NullPool,
-    )
-
-    for connectable in [connectable_main, connectable_test]:
+    for url in [connection_string, test_connection_string]:
+        if url.endswith(':memory:'):
+            # Nothing would outlive the migration: the tests migrate their own DB.
+            continue
+        connectable = create_async_engine(
+            url,
+            future=True,
+            poolclass=pool.NullPool,
+        )
         async with connectable.connect() as connection:
             await connection.run_sync(do_run_migrations)
 
         await connectable.dispose()
 
-
 if context.is_offline_mode():
     run_migrations_offline()
+elif config.attributes.get('connection') is not None:
+    # A connection given by the caller, e.g. the tests migrating an in-memory DB.
+    do_run_migrations(config.attributes['connection'])
 else:
     import asyncio
     asyncio.run(run_migrations_online())
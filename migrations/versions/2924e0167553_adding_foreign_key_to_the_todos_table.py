@@ -18,13 +18,15 @@ depends_on = None
 
 def upgrade():
     # ### commands auto generated by Alembic - please adjust! ###
-    op.add_column('todos', sa.Column('user_id', sa.Integer(), nullable=False))
-    op.create_foreign_key(constraint_name='todos_user_id_fkey', source_table='todos', referent_table='users', local_cols=['user_id'], remote_cols=['id'], ondelete='CASCADE')
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=False))
+        batch_op.create_foreign_key(constraint_name='todos_user_id_fkey', referent_table='users', local_cols=['user_id'], remote_cols=['id'], ondelete='CASCADE')
     # ### end Alembic commands ###
 
 
 def downgrade():
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_constraint(constraint_name='todos_user_id_fkey', table_name='todos', type_='foreignkey')
-    op.drop_column('todos', 'user_id')
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.drop_constraint(constraint_name='todos_user_id_fkey', type_='foreignkey')
+        batch_op.drop_column('user_id')
     # ### end Alembic commands ###
@@ -26,7 +26,8 @@ def upgrade():
     sa.Column('description', sa.String(), nullable=True),
     sa.Column('creation_date', sa.Integer(), nullable=False),
     sa.Column('is_finished', sa.Boolean(), nullable=True),
-    sa.PrimaryKeyConstraint('id')
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
     )
     # ### end Alembic commands ###
 
@@ -0,0 +1,74 @@
+"""Partitioning the todos table by user_id
+
+Revision ID: b18435e455fa
+Revises: 9af49c3401a8
+Create Date: 2026-10-19 12:41:06.730512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from partitions import partition_ddl
+from settings import todo_partitions
+
+
+# revision identifiers, used by Alembic.
+revision = 'b18435e455fa'
+down_revision = '9af49c3401a8'
+branch_labels = None
+depends_on = None
+
+COLUMNS = 'id, title, description, creation_date, is_finished, user_id'
+
+
+def upgrade():
+    # SQLite has no partitioning: "todos" keeps its primary key on "id" alone
+    # (the rowid, so it can be generated) and its "ix_todos_user_id" index.
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    # The partition key has to be part of the primary key, so it becomes (user_id, id).
+    # "ix_todos_user_id" is dropped as the new primary key already starts with user_id.
+    op.execute('ALTER TABLE todos RENAME TO todos_monolithic')
+    op.execute('ALTER INDEX todos_pkey RENAME TO todos_monolithic_pkey')
+    op.execute('ALTER TABLE todos_monolithic RENAME CONSTRAINT todos_user_id_fkey '
+               'TO todos_monolithic_user_id_fkey')
+    op.drop_index('ix_todos_user_id', table_name='todos_monolithic')
+    op.create_table('todos',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('todos_id_seq')"), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('creation_date', sa.Integer(), nullable=False),
+    sa.Column('is_finished', sa.Boolean(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='todos_user_id_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'id', name='todos_pkey'),
+    postgresql_partition_by='HASH (user_id)'
+    )
+    op.create_index('ix_todos_id', 'todos', ['id'])
+    for statement in partition_ddl(todo_partitions):
+        op.execute(statement)
+    op.execute(f'INSERT INTO todos ({COLUMNS}) SELECT {COLUMNS} FROM todos_monolithic')
+    op.execute('ALTER SEQUENCE todos_id_seq OWNED BY todos.id')
+    op.drop_table('todos_monolithic')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    op.execute('ALTER TABLE todos RENAME TO todos_partitioned')
+    op.execute('ALTER INDEX todos_pkey RENAME TO todos_partitioned_pkey')
+    op.execute('ALTER TABLE todos_partitioned RENAME CONSTRAINT todos_user_id_fkey '
+               'TO todos_partitioned_user_id_fkey')
+    op.create_table('todos',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('todos_id_seq')"), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('creation_date', sa.Integer(), nullable=False),
+    sa.Column('is_finished', sa.Boolean(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='todos_user_id_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name='todos_pkey')
+    )
+    op.create_index('ix_todos_user_id', 'todos', ['user_id'])
+    op.execute(f'INSERT INTO todos ({COLUMNS}) SELECT {COLUMNS} FROM todos_partitioned')
+    op.execute('ALTER SEQUENCE todos_id_seq OWNED BY todos.id')
+    op.drop_table('todos_partitioned')
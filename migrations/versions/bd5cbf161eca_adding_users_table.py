@@ -8,8 +8,6 @@ Create Date: 2024-08-19 14:10:05.131263
 from alembic import op
 import sqlalchemy as sa
 from sqlalchemy.dialects import postgresql
-from sqlalchemy.orm import Session
-from models import User
 from settings import admin_username, admin_email, admin_password, admin_hashed_password
 from datetime import datetime
 
@@ -40,45 +38,48 @@ def upgrade():
     sa.Column('role', user_role_enum, nullable=False),
     sa.PrimaryKeyConstraint('id')
     )
-    op.alter_column('todos', 'title',
-               existing_type=sa.VARCHAR(),
-               nullable=False)
-    op.alter_column('todos', 'description',
-               existing_type=sa.VARCHAR(),
-               nullable=False)
-    op.alter_column('todos', 'is_finished',
-               existing_type=sa.BOOLEAN(),
-               nullable=False)
-    op.create_unique_constraint(None, 'users', ['username'])
-    op.create_unique_constraint(None, 'users', ['email'])
+    # Batch mode, as SQLite can only change constraints by recreating the tables.
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.alter_column('title',
+                   existing_type=sa.VARCHAR(),
+                   nullable=False)
+        batch_op.alter_column('description',
+                   existing_type=sa.VARCHAR(),
+                   nullable=False)
+        batch_op.alter_column('is_finished',
+                   existing_type=sa.BOOLEAN(),
+                   nullable=False)
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.create_unique_constraint('users_username_key', ['username'])
+        batch_op.create_unique_constraint('users_email_key', ['email'])
     # ### end Alembic commands ###
-    bind = op.get_bind()
-    session = Session(bind=bind)
 
-    # Creating the default admin user
-    admin_user = User(
-        username=admin_username,
-        email=admin_email,
-        password=admin_hashed_password, 
-        role='ADMIN',
-        creation_date=(int(datetime.now().timestamp()))
-    )
-
-    session.add(admin_user)
-    session.commit()
+    # Creating the default admin user. The table is described as it is at this
+    # revision: the "users" model has columns added by later migrations.
+    users = sa.table('users', sa.column('username'), sa.column('email'),
+                     sa.column('password'), sa.column('role', user_role_enum),
+                     sa.column('creation_date'))
+    op.bulk_insert(users, [{
+        'username': admin_username,
+        'email': admin_email,
+        'password': admin_hashed_password.decode(),
+        'role': 'ADMIN',
+        'creation_date': int(datetime.now().timestamp())
+    }])
     print(f"\nAdmin password is: {admin_password}\n")
 
 def downgrade():
     # ### commands auto generated by Alembic - please adjust! ###
-    op.alter_column('todos', 'is_finished',
-               existing_type=sa.BOOLEAN(),
-               nullable=True)
-    op.alter_column('todos', 'description',
-               existing_type=sa.VARCHAR(),
-               nullable=True)
-    op.alter_column('todos', 'title',
-               existing_type=sa.VARCHAR(),
-               nullable=True)
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.alter_column('is_finished',
+                   existing_type=sa.BOOLEAN(),
+                   nullable=True)
+        batch_op.alter_column('description',
+                   existing_type=sa.VARCHAR(),
+                   nullable=True)
+        batch_op.alter_column('title',
+                   existing_type=sa.VARCHAR(),
+                   nullable=True)
     op.drop_table('users')
     user_role_enum.drop(op.get_bind(), checkfirst=True)
     # ### end Alembic commands ###
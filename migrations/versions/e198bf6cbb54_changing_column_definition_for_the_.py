@@ -18,19 +18,28 @@ depends_on = None
 
 def upgrade():
     # ### commands auto generated by Alembic - please adjust! ###
-    op.execute('ALTER TABLE users ALTER COLUMN password TYPE BYTEA USING password::bytea')
-    op.alter_column('users', 'password',
-               existing_type=sa.VARCHAR(length=255),
-               type_=sa.LargeBinary(length=255),
-               existing_nullable=False)
+    if op.get_bind().dialect.name == 'sqlite':
+        # Column types are only affinities in SQLite, the values have to be converted.
+        op.execute('UPDATE users SET password = CAST(password AS BLOB)')
+    else:
+        op.execute('ALTER TABLE users ALTER COLUMN password TYPE BYTEA USING password::bytea')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password',
+                   existing_type=sa.VARCHAR(length=255),
+                   type_=sa.LargeBinary(length=255),
+                   existing_nullable=False)
     # ### end Alembic commands ###
 
 
 def downgrade():
     # ### commands auto generated by Alembic - please adjust! ###
-    op.execute('ALTER TABLE users ALTER COLUMN password TYPE VARCHAR(255)')
-    op.alter_column('users', 'password',
-               existing_type=sa.LargeBinary(length=255),
-               type_=sa.VARCHAR(length=255),
-               existing_nullable=False)
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('UPDATE users SET password = CAST(password AS TEXT)')
+    else:
+        op.execute('ALTER TABLE users ALTER COLUMN password TYPE VARCHAR(255)')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password',
+                   existing_type=sa.LargeBinary(length=255),
+                   type_=sa.VARCHAR(length=255),
+                   existing_nullable=False)
     # ### end Alembic commands ###
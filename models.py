@@ -3,7 +3,9 @@ models.py
 This module contains the model for the "todos" database.
 """
 import enum
-from sqlalchemy import Integer, String, Enum, LargeBinary, ForeignKey
+from typing import Optional
+from sqlalchemy import Integer, String, Enum, LargeBinary, ForeignKey, Float, \
+    PrimaryKeyConstraint, Index, text, BigInteger, Sequence
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -13,6 +15,10 @@ class Base(DeclarativeBase):  # pylint: disable=R0903
     """
 
 
+# Shared by "todos" and "todo_tombstones", so their revisions never collide.
+REVISION_SEQUENCE = Sequence("todos_revision_seq", metadata=Base.metadata)
+
+
 class UserRole(str, enum.Enum):
     """
     Class for the user roles.
@@ -33,6 +39,9 @@ class User(Base):  # pylint: disable=R0903
     creation_date: Mapped[int] = mapped_column(Integer, nullable=False)
     role: Mapped[UserRole] = mapped_column(Enum(UserRole),
                                            insert_default=UserRole.USER, nullable=False)
+    token_version: Mapped[int] = mapped_column(Integer, server_default="0",
+                                               insert_default=0, nullable=False)
+    deleted_at: Mapped[Optional[int]] = mapped_column(Integer)
 
     def __repr__(self) -> str:
         return f"User(id={self.id!r}, username={self.username!r}, email={self.email!r}, \
@@ -41,17 +50,143 @@ class User(Base):  # pylint: disable=R0903
 
 class Todo(Base):  # pylint: disable=R0903
     """
-    Represents the 'todos' table in the database.
+    Represents the 'todos' table in the database. On Postgres it is partitioned
+    by hash of "user_id", so the primary key has to include it (on SQLite, the
+    table keeps its primary key on "id" alone, see the migrations).
     """
     __tablename__ = "todos"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "id", name="todos_pkey"),
+        Index("ix_todos_id", "id"),
+        Index("ix_todos_finished_creation_date", "creation_date",
+              postgresql_where=text("is_finished"), sqlite_where=text("is_finished")),
+        Index("ix_todos_user_id_revision", "user_id", "revision"),
+        {"postgresql_partition_by": "HASH (user_id)"},
+    )
+    id: Mapped[int] = mapped_column(Integer, autoincrement=True)
     title: Mapped[str] = mapped_column(String(30))
     description: Mapped[str] = mapped_column(String(255))
     creation_date: Mapped[int] = mapped_column(Integer, nullable=False)
     is_finished: Mapped[bool] = mapped_column(insert_default=False)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    updated_at: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Taken from a sequence on every write, it is the cursor of the changes feed.
+    revision: Mapped[int] = mapped_column(BigInteger, nullable=False,
+                                          server_default=REVISION_SEQUENCE.next_value())
 
     def __repr__(self) -> str:
         return f"Todo(id={self.id!r}, title={self.title!r}, description={self.description!r}, \
             creation_date={self.creation_date!r}, \
             is_finished={self.is_finished!r}, user_id={self.user_id!r})"
+
+
+class RateLimitBucket(Base):  # pylint: disable=R0903
+    """
+    Represents the 'rate_limit_buckets' table, used when the buckets are shared in Postgres.
+    The "tat" column is the theoretical arrival time (unix seconds) of the next request.
+    """
+    __tablename__ = "rate_limit_buckets"
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    tat: Mapped[float] = mapped_column(Float, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"RateLimitBucket(key={self.key!r}, tat={self.tat!r})"
+
+
+class TokenRevocation(Base):  # pylint: disable=R0903
+    """
+    Represents the 'token_revocations' table. A row either revokes a single token
+    (by its "jti") or every token of a user issued before "not_before_version".
+    """
+    __tablename__ = "token_revocations"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    jti: Mapped[Optional[str]] = mapped_column(String(32))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    not_before_version: Mapped[Optional[int]] = mapped_column(Integer)
+    expires_at: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"TokenRevocation(id={self.id!r}, jti={self.jti!r}, user_id={self.user_id!r}, \
+            not_before_version={self.not_before_version!r}, expires_at={self.expires_at!r})"
+
+
+class UserDeletion(Base):  # pylint: disable=R0903
+    """
+    Represents the 'user_deletions' table, tracking users whose todos are being
+    purged in the background. Rows are kept after the user row is removed.
+    """
+    __tablename__ = "user_deletions"
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    requested_at: Mapped[int] = mapped_column(Integer, nullable=False)
+    finished_at: Mapped[Optional[int]] = mapped_column(Integer)
+    deleted_todos: Mapped[int] = mapped_column(Integer, server_default="0",
+                                               insert_default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"UserDeletion(user_id={self.user_id!r}, requested_at={self.requested_at!r}, \
+            finished_at={self.finished_at!r}, deleted_todos={self.deleted_todos!r})"
+
+
+class TodoArchive(Base):  # pylint: disable=R0903
+    """
+    Represents the 'todos_archive' table, where finished todos are moved once
+    they are old enough, keeping the indexes of the "todos" table small.
+    """
+    __tablename__ = "todos_archive"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "id", name="todos_archive_pkey"),
+        Index("ix_todos_archive_id", "id"),
+    )
+    id: Mapped[int] = mapped_column(Integer, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(30))
+    description: Mapped[str] = mapped_column(String(255))
+    creation_date: Mapped[int] = mapped_column(Integer, nullable=False)
+    is_finished: Mapped[bool] = mapped_column(nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    archived_at: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"TodoArchive(id={self.id!r}, title={self.title!r}, user_id={self.user_id!r}, \
+            archived_at={self.archived_at!r})"
+
+
+class TodoTombstone(Base):  # pylint: disable=R0903
+    """
+    Represents the 'todo_tombstones' table, recording deleted todos so the
+    changes feed can tell clients to remove them.
+    """
+    __tablename__ = "todo_tombstones"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "id", name="todo_tombstones_pkey"),
+        Index("ix_todo_tombstones_user_id_revision", "user_id", "revision"),
+    )
+    id: Mapped[int] = mapped_column(Integer, autoincrement=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    revision: Mapped[int] = mapped_column(BigInteger, nullable=False,
+                                          server_default=REVISION_SEQUENCE.next_value())
+    deleted_at: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"TodoTombstone(id={self.id!r}, user_id={self.user_id!r}, \
+            revision={self.revision!r}, deleted_at={self.deleted_at!r})"
+
+
+class IdempotencyKey(Base):  # pylint: disable=R0903
+    """
+    Represents the 'idempotency_keys' table, holding the first response to each
+    "Idempotency-Key" sent by a user. "status_code" is null while that first
+    request is still running.
+    """
+    __tablename__ = "idempotency_keys"
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"),
+                                         primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[Optional[int]] = mapped_column(Integer)
+    body: Mapped[Optional[bytes]] = mapped_column(LargeBinary)
+    media_type: Mapped[Optional[str]] = mapped_column(String(100))
+    expires_at: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"IdempotencyKey(user_id={self.user_id!r}, key={self.key!r}, \
+            status_code={self.status_code!r}, expires_at={self.expires_at!r})"
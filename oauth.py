@@ -2,12 +2,14 @@
 oauth.py
 Handles token creation and verification. 
 """
+import uuid
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from settings import SECRET_KEY
 from schemas import TokenData, UserRole
+from revocation import deny_list
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/api/v1/login')
 ALGORITHM = "HS256"
@@ -16,44 +18,67 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 10080
 
 def create_access_token(data: dict):
     """
-    Function to create a new access token.
+    Function to create a new access token. Every token gets a unique "jti"
+    so it can be revoked on its own.
     """
     to_encode = data.copy()
     expiration = datetime.now(timezone.utc) + \
                  timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expiration})
+    to_encode.update({"exp": expiration, "jti": uuid.uuid4().hex})
 
     encoded_token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_token
 
 
-def verify_access_token(access_token, credentials_exception):
+def decode_access_token(access_token, credentials_exception) -> dict:
     """
-    Function to verify the access token.
+    Function to decode the access token and reject it if it was revoked.
     """
     try:
         payload = jwt.decode(key=SECRET_KEY, token=access_token, algorithms=[ALGORITHM])
-        uid: int = payload.get("user_id")
-        role: UserRole = payload.get("user_role")
-
-        if uid is None:
-            raise credentials_exception
-        token_data = TokenData(id=uid, role=role)
-
     except JWTError as e:
         raise credentials_exception from e
 
+    if deny_list.is_revoked(payload.get("jti"), payload.get("user_id"), payload.get("ver", 0)):
+        raise credentials_exception
+    return payload
+
+
+def verify_access_token(access_token, credentials_exception):
+    """
+    Function to verify the access token.
+    """
+    payload = decode_access_token(access_token, credentials_exception)
+    uid: int = payload.get("user_id")
+    role: UserRole = payload.get("user_role")
+
+    if uid is None:
+        raise credentials_exception
+    token_data = TokenData(id=uid, role=role)
+
     return token_data.id, token_data.role
 
 
+def credentials_error() -> HTTPException:
+    """
+    Function to build the exception returned for missing or invalid tokens.
+    """
+    return HTTPException(status_code=401,
+                         detail='Could not validate credentials.',
+                         headers={"WWW-Authenticate": "Bearer"})
+
+
 def get_current_user(access_token: str = Depends(oauth2_scheme)):
     """
     Function to identify the current user.
     """
-    credentials_exception = HTTPException(status_code=401,
-                                          detail='Could not validate credentials.',
-                                          headers={"WWW-Authenticate": "Bearer"})
-
     user_id, user_role = verify_access_token(access_token,
-                                             credentials_exception=credentials_exception)
+                                             credentials_exception=credentials_error())
     return user_id, user_role
+
+
+def get_token_claims(access_token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Function to get all the claims of the current token (e.g. to revoke it).
+    """
+    return decode_access_token(access_token, credentials_exception=credentials_error())
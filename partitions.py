@@ -0,0 +1,58 @@
+"""
+partitions.py
+Maintenance command for the partitions of the "todos" table, which is
+partitioned by hash of "user_id". It creates any partition missing for the
+configured modulus and prints the estimated row count of each one.
+
+Usage:
+    python partitions.py [--test]
+"""
+import asyncio
+import sys
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncEngine
+from db import engine, test_engine
+from settings import todo_partitions
+
+
+def partition_name(remainder: int) -> str:
+    """
+    Function to get the name of a "todos" partition.
+    """
+    return f"todos_p{remainder}"
+
+
+def partition_ddl(modulus: int) -> list[str]:
+    """
+    Function to get the statements creating every partition for the modulus.
+    """
+    return [
+        f"CREATE TABLE IF NOT EXISTS {partition_name(remainder)} PARTITION OF todos "
+        f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+        for remainder in range(modulus)
+    ]
+
+
+async def ensure_partitions(db_engine: AsyncEngine, modulus: int = todo_partitions) -> dict:
+    """
+    Function to create the missing partitions of the "todos" table.
+
+    Returns:
+        The estimated number of rows in each partition (from the planner statistics).
+    """
+    async with db_engine.begin() as conn:
+        for statement in partition_ddl(modulus):
+            await conn.execute(sa.text(statement))
+        result = await conn.execute(sa.text(
+            "SELECT c.relname, greatest(c.reltuples, 0)::bigint FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'todos'::regclass"
+        ))
+        counts = dict(result.all())
+    return {partition_name(remainder): counts.get(partition_name(remainder), 0)
+            for remainder in range(modulus)}
+
+
+if __name__ == "__main__":
+    target = test_engine if "--test" in sys.argv else engine
+    for name, rows in asyncio.run(ensure_partitions(target)).items():
+        print(f"{name}: {rows} rows")
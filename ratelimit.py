@@ -0,0 +1,150 @@
+"""
+ratelimit.py
+Token bucket rate limiting for the API routes. Buckets are keyed by the user ID
+of the token holder, or by the client IP for anonymous routes.
+"""
+import logging
+import math
+import time
+from typing import NamedTuple
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+import sqlalchemy as sa
+from dialects import upsert
+from models import RateLimitBucket
+from oauth import get_current_user
+from routers.db_functions import get_engine
+from settings import rate_limit_backend, rate_limits
+
+TOO_MANY_REQUESTS = 'Too many requests. Please try again later.'
+
+
+class RateLimitRule(NamedTuple):
+    """
+    A bucket holding up to "burst" tokens that refills completely every "period" seconds.
+    """
+    burst: int
+    period: float
+
+    @property
+    def interval(self) -> float:
+        """
+        Seconds needed to refill a single token.
+        """
+        return self.period / self.burst
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateLimitRule":
+        """
+        Function to build a rule from a "<burst>/<seconds>" string.
+        """
+        burst, period = spec.split('/')
+        return cls(burst=int(burst), period=float(period))
+
+
+RULES = {scope: RateLimitRule.parse(spec) for scope, spec in rate_limits.items()}
+
+
+class MemoryBucketStore:  # pylint: disable=R0903
+    """
+    In-process bucket store. Each bucket is kept as a single float (the GCRA
+    "theoretical arrival time"), in a dict ordered by last use so the least
+    recently used buckets can be evicted once "max_keys" is reached.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self.buckets: dict[str, float] = {}
+
+    def consume(self, key: str, rule: RateLimitRule) -> float:
+        """
+        Function to take a token from the bucket.
+
+        Returns:
+            0 if the request is allowed, otherwise the seconds to wait.
+        """
+        now = time.monotonic()
+        tat = max(self.buckets.pop(key, now), now)
+        wait = tat + rule.interval - now - rule.period
+        self.buckets[key] = tat if wait > 0 else tat + rule.interval
+        if len(self.buckets) > self.max_keys:
+            del self.buckets[next(iter(self.buckets))]
+        return max(wait, 0.0)
+
+
+memory_store = MemoryBucketStore()
+
+
+async def consume_shared(engine: AsyncEngine, key: str, rule: RateLimitRule) -> float:
+    """
+    Function to take a token from a bucket shared through the "rate_limit_buckets"
+    table, so every worker and pod sees the same limits. The update only happens
+    when the request is allowed, which keeps it to a single statement on the hot path.
+
+    Returns:
+        0 if the request is allowed, otherwise the seconds to wait.
+    """
+    now = time.time()
+    bucket = RateLimitBucket.__table__
+    next_tat = sa.case((bucket.c.tat > now, bucket.c.tat), else_=now) + rule.interval
+    query = (
+        upsert(engine, bucket)
+        .values(key=key, tat=now + rule.interval)
+        .on_conflict_do_update(index_elements=[bucket.c.key], set_={'tat': next_tat},
+                               where=next_tat - now <= rule.period)
+        .returning(bucket.c.tat)
+    )
+    async with engine.begin() as conn:
+        result = await conn.execute(query)
+        if result.first() is not None:
+            return 0.0
+        result = await conn.execute(sa.select(bucket.c.tat).where(bucket.c.key == key))
+        tat = result.scalar()
+    return max(tat + rule.interval - now - rule.period, 0.0)
+
+
+async def enforce(key: str, rule: RateLimitRule, engine: AsyncEngine):
+    """
+    Function to reject the request with a 429 once the bucket is empty.
+    """
+    if rate_limit_backend == 'postgres':
+        try:
+            wait = await consume_shared(engine, key, rule)
+        except SQLAlchemyError as error:
+            # Better to let the request through than to fail every route.
+            logging.error("Rate limit backend unavailable: %s", error)
+            wait = 0.0
+    else:
+        wait = memory_store.consume(key, rule)
+
+    if wait > 0:
+        raise HTTPException(status_code=429, detail=TOO_MANY_REQUESTS,
+                            headers={"Retry-After": str(math.ceil(wait))})
+
+
+def limit_by_ip(scope: str):
+    """
+    Function to create a dependency limiting anonymous routes per client IP.
+    """
+    rule = RULES[scope]
+
+    async def dependency(request: Request, engine: AsyncEngine = Depends(get_engine)):
+        client_ip = request.client.host if request.client else 'unknown'
+        await enforce(f"{scope}:ip:{client_ip}", rule, engine)
+
+    return dependency
+
+
+def limit_by_user(scope: str):
+    """
+    Function to create a dependency limiting authenticated routes per user ID.
+    """
+    rule = RULES[scope]
+
+    async def dependency(user_data: tuple = Depends(get_current_user),
+                         engine: AsyncEngine = Depends(get_engine)):
+        user_id, _ = user_data
+        await enforce(f"{scope}:user:{user_id}", rule, engine)
+
+    return dependency
@@ -0,0 +1,179 @@
+"""
+responses.py
+Response encodings negotiated with the client: MessagePack bodies for clients
+sending "Accept: application/msgpack", and brotli or gzip compression of large
+JSON and MessagePack responses (following "Accept-Encoding"). Typed results are
+encoded to JSON bytes directly by pydantic-core, skipping FastAPI's generic encoder.
+"""
+import zlib
+from typing import Any, Optional
+import brotli
+import msgpack
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.datastructures import Headers, MutableHeaders
+
+MSGPACK_TYPE = 'application/msgpack'
+COMPRESSIBLE_TYPES = ('application/json', MSGPACK_TYPE)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+def quality_values(header: str) -> dict[str, float]:
+    """
+    Function to parse an "Accept" or "Accept-Encoding" header.
+
+    Returns:
+        The quality ("q" parameter, 1 by default) of each listed value.
+    """
+    qualities = {}
+    for item in header.split(','):
+        value, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        if value:
+            qualities[value.lower()] = quality
+    return qualities
+
+
+class MsgPackResponse(Response):
+    """
+    Response rendering its content as MessagePack.
+    """
+    media_type = MSGPACK_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=jsonable_encoder)
+
+
+def typed_json(adapter: TypeAdapter, content: Any) -> Response:
+    """
+    Function to validate an endpoint result against its response type and encode
+    it to JSON, both in pydantic-core. FastAPI would validate it, convert it back
+    to Python objects and then encode those with the "json" module.
+
+    Returns:
+        The JSON response.
+    """
+    body = adapter.dump_json(adapter.validate_python(content))
+    return Response(body, media_type='application/json')
+
+
+def negotiate(request: Request, content: Any, adapter: Optional[TypeAdapter] = None) -> Any:
+    """
+    Function to pick the format of an endpoint result from the "Accept" header.
+
+    Returns:
+        A MessagePack response if the client prefers it, otherwise a JSON response
+        encoded with the "adapter" (or the content unchanged, for FastAPI to encode).
+    """
+    accepted = quality_values(request.headers.get('accept', ''))
+    msgpack_quality = max(accepted.get(MSGPACK_TYPE, 0.0),
+                          accepted.get('application/x-msgpack', 0.0))
+    if msgpack_quality > 0 and msgpack_quality >= accepted.get('application/json', 0.0):
+        return MsgPackResponse(content)
+    if adapter is not None:
+        return typed_json(adapter, content)
+    return content
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Function to pick the content encoding, preferring brotli over gzip.
+
+    Returns:
+        "br", "gzip" or None if the client accepts neither.
+    """
+    accepted = quality_values(accept_encoding)
+    brotli_quality, gzip_quality = accepted.get('br', 0.0), accepted.get('gzip', 0.0)
+    if brotli_quality > 0 and brotli_quality >= gzip_quality:
+        return 'br'
+    if gzip_quality > 0:
+        return 'gzip'
+    return None
+
+
+class StreamCompressor:  # pylint: disable=R0903
+    """
+    Incremental brotli or gzip compressor. Every chunk is flushed, so streamed
+    responses reach the client as they are produced instead of being held back.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """
+        Function to compress the next chunk of the body.
+        """
+        if self.encoding == 'br':
+            output = self.compressor.process(data)
+            return output + (self.compressor.finish() if final else self.compressor.flush())
+        output = self.compressor.compress(data)
+        return output + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:  # pylint: disable=R0903
+    """
+    ASGI middleware compressing JSON and MessagePack responses. Bodies sent in a
+    single message are only compressed from "minimum_size" bytes; streamed bodies
+    always are, chunk by chunk. Other types (e.g. Server-Sent Events) pass through.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message['type'] == 'http.response.start':
+                start_message = message
+                return
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if start_message is not None:
+                response_start, start_message = start_message, None
+                headers = MutableHeaders(raw=response_start['headers'])
+                media_type = headers.get('content-type', '').split(';')[0].strip()
+                if ('content-encoding' not in headers and media_type in COMPRESSIBLE_TYPES
+                        and (more_body or len(body) >= self.minimum_size)):
+                    compressor = StreamCompressor(encoding)
+                    del headers['content-length']
+                    headers['content-encoding'] = encoding
+                    headers.add_vary_header('Accept-Encoding')
+                await send(response_start)
+
+            if compressor is not None:
+                message = {'type': 'http.response.body',
+                           'body': compressor.compress(body, final=not more_body),
+                           'more_body': more_body}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
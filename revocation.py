@@ -0,0 +1,88 @@
+"""
+revocation.py
+In-memory deny-list of revoked access tokens. Tokens are checked against it on
+every request without touching the DB; the "token_revocations" table is only
+read incrementally in the background to pick up revocations made by other workers.
+"""
+import asyncio
+import logging
+import time
+import sqlalchemy as sa
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from models import TokenRevocation
+
+
+class DenyList:
+    """
+    Revoked token IDs and, per user, the lowest token version still accepted.
+    Both map to the time the entry can be forgotten (when the tokens it covers
+    would have expired anyway).
+    """
+
+    def __init__(self):
+        self.tokens: dict[str, int] = {}
+        self.versions: dict[int, tuple[int, int]] = {}
+        self.cursor = 0
+
+    def is_revoked(self, jti, user_id: int, version: int) -> bool:
+        """
+        Function to check a decoded token against the deny-list.
+        """
+        if jti in self.tokens:
+            return True
+        min_version = self.versions.get(user_id)
+        return min_version is not None and version < min_version[0]
+
+    def add(self, revocation: TokenRevocation):
+        """
+        Function to apply a revocation row to the deny-list.
+        """
+        if revocation.jti is not None:
+            self.tokens[revocation.jti] = revocation.expires_at
+        if revocation.not_before_version is not None:
+            current = self.versions.get(revocation.user_id, (0, 0))
+            if revocation.not_before_version >= current[0]:
+                self.versions[revocation.user_id] = (revocation.not_before_version,
+                                                     revocation.expires_at)
+
+    def prune(self, now: int):
+        """
+        Function to forget entries whose tokens have all expired.
+        """
+        self.tokens = {jti: exp for jti, exp in self.tokens.items() if exp > now}
+        self.versions = {uid: entry for uid, entry in self.versions.items() if entry[1] > now}
+
+    async def refresh(self, engine: AsyncEngine):
+        """
+        Function to load the revocations added since the last refresh.
+        """
+        now = int(time.time())
+        query = (
+            sa.select(TokenRevocation)
+            .where(TokenRevocation.id > self.cursor, TokenRevocation.expires_at > now)
+            .order_by(TokenRevocation.id)
+        )
+        async with engine.begin() as conn:
+            result = await conn.execute(query)
+            for revocation in result:
+                self.add(revocation)
+                self.cursor = revocation.id
+            await conn.execute(
+                sa.delete(TokenRevocation).where(TokenRevocation.expires_at <= now)
+            )
+        self.prune(now)
+
+    async def run(self, engine: AsyncEngine, interval: float):
+        """
+        Function to keep the deny-list refreshed until cancelled.
+        """
+        while True:
+            try:
+                await self.refresh(engine)
+            except SQLAlchemyError as error:
+                logging.error("Unable to refresh the token deny-list: %s", error)
+            await asyncio.sleep(interval)
+
+
+deny_list = DenyList()
@@ -7,6 +7,7 @@ from routers.tasks import router as tasks_router
 from routers.misc_routes import router as misc_router
 from routers.users import router as users_router
 from routers.auth import router as auth_router
+from routers.batch import router as batch_router
 
 
 api_v1_router = APIRouter()
@@ -15,3 +16,4 @@ api_v1_router.include_router(misc_router, tags=["misc_routes"])
 api_v1_router.include_router(tasks_router, prefix="/tasks", tags=["tasks"])
 api_v1_router.include_router(users_router, prefix="/users", tags=["users"])
 api_v1_router.include_router(auth_router, tags=["auth"])
+api_v1_router.include_router(batch_router, tags=["batch"])
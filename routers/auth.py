@@ -4,14 +4,16 @@ Routes are configured for the authentication endpoints.
 """
 from fastapi import APIRouter, Depends
 from fastapi.security import OAuth2PasswordRequestForm
-from crud.users import user_login
-from schemas import Token
+from crud.users import user_login, revoke_access_token
+from schemas import Token, ConnectionResponse
+from oauth import get_token_claims
 from routers.db_functions import get_db, AsyncSession
+from ratelimit import limit_by_ip
 
 router = APIRouter()
 
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(limit_by_ip('login'))])
 async def login(user_credentials: OAuth2PasswordRequestForm = Depends(),
                 db: AsyncSession = Depends(get_db)):
     """
@@ -22,3 +24,17 @@ async def login(user_credentials: OAuth2PasswordRequestForm = Depends(),
     """
     user_token = await user_login(user_credentials=user_credentials, db=db)
     return user_token
+
+
+@router.post("/logout", status_code=200)
+async def logout(claims: dict = Depends(get_token_claims),
+                 db: AsyncSession = Depends(get_db)) -> ConnectionResponse:
+    """
+    Endpoint to logout, revoking the token used for the request.
+
+    Returns:
+        ConnectionResponse: Indicates the success or failure \
+            of the transaction (status and message).
+    """
+    result = await revoke_access_token(claims=claims, db=db)
+    return result
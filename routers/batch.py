@@ -0,0 +1,29 @@
+"""
+batch.py
+Routes are configured for the batch endpoint.
+"""
+from fastapi import APIRouter, Depends
+from crud.batch import run_batch
+from schemas import BatchRequest, BatchResponse
+from routers.db_functions import get_db, AsyncSession
+from routers.tasks import get_user_id, get_user_role
+from ratelimit import limit_by_user
+from idempotency import IDEMPOTENT, IdempotentRoute
+
+router = APIRouter(dependencies=[Depends(limit_by_user('tasks'))], route_class=IdempotentRoute)
+
+
+@router.post("/batch", status_code=200, dependencies=IDEMPOTENT)
+async def batch_operations(batch: BatchRequest, db: AsyncSession = Depends(get_db),
+                           user_id: int = Depends(get_user_id),
+                           user_role: str = Depends(get_user_role)) -> BatchResponse:
+    """
+    Endpoint to run several task operations (create, update, finish, delete
+    and get) in one request, sharing a single DB session.
+    
+    Returns:
+        BatchResponse: Whether the changes were committed, \
+            and the status code and body of each operation.
+    """
+    result = await run_batch(batch=batch, user_id=user_id, user_role=user_role, db=db)
+    return result
@@ -1,10 +1,11 @@
 """
 misc_routes.py
-Routes are configured for the test and db_schema endpoints.
+Routes are configured for the test, db_schema and health endpoints.
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from crud.tasks import connect_test, get_schema
-from schemas import ConnectionResponse, BasicResponse
+from schemas import ConnectionResponse, BasicResponse, HealthStatus
+from health import prober
 from routers.db_functions import get_db, get_engine, AsyncEngine, AsyncSession
 
 router = APIRouter()
@@ -56,3 +57,30 @@ async def get_schema_version(db: AsyncSession = Depends(get_db)) -> str:
     """
     result = await get_schema(db=db)
     return result
+
+
+@router.get("/healthz")
+async def health_check() -> HealthStatus:
+    """
+    Liveness probe. It always succeeds while the worker is running, reporting
+    the last DB check without running a new one.
+    
+    Returns:
+        HealthStatus: The result and age of the last DB check.
+    """
+    return prober.status()
+
+
+@router.get("/readyz")
+async def readiness_check(response: Response) -> HealthStatus:
+    """
+    Readiness probe, answered from the last DB check. It fails with a 503 when the
+    DB was unreachable, its schema is not up to date, or the check is stale.
+    
+    Returns:
+        HealthStatus: The result and age of the last DB check.
+    """
+    status = prober.status()
+    if not status["ready"]:
+        response.status_code = 503
+    return status
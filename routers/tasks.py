@@ -2,15 +2,19 @@
 tasks.py
 Routes are configured for the tasks endpoints.
 """
-from typing import Union
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from crud.tasks import create_todo_task, update_todo_task, get_all_todo_tasks, \
-    get_todo_task_by_id, delete_todo_task, mark_todo_task_completed
-from schemas import ConnectionResponse, TodoData, IsFinished
+    get_todo_task_by_id, delete_todo_task, mark_todo_task_completed, get_task_changes
+from schemas import ConnectionResponse, TodoData, IsFinished, TaskChanges, TodoRead, TODO_LIST
 from routers.db_functions import get_db, AsyncSession
 from oauth import get_current_user
+from ratelimit import limit_by_user
+from events import event_stream
+from responses import negotiate, typed_json
+from idempotency import IDEMPOTENT, IdempotentRoute
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(limit_by_user('tasks'))], route_class=IdempotentRoute)
 
 
 async def get_user_id(user_data: tuple = Depends(get_current_user)) -> int:
@@ -36,33 +40,69 @@ async def get_user_role(user_data: tuple = Depends(get_current_user)) -> str:
 
 
 @router.get("/")
-async def get_all_todos(db: AsyncSession = Depends(get_db), user_id: int = Depends(get_user_id),
-                        user_role: str = Depends(get_user_role)) -> Union[list, dict]:
+async def get_all_todos(request: Request, include_archived: bool = False,
+                        db: AsyncSession = Depends(get_db), user_id: int = Depends(get_user_id),
+                        user_role: str = Depends(get_user_role)) -> list[TodoRead]:
     """
-    Endpoint to get the list of all todos.
+    Endpoint to get the list of all todos. Archived todos are only
+    included when "include_archived" is set. Sent as MessagePack
+    when requested with "Accept: application/msgpack".
     
     Returns:
        Returns the list of elements.
     """
-    result = await get_all_todo_tasks(user_id=user_id, user_role=user_role, db=db)
+    result = await get_all_todo_tasks(user_id=user_id, user_role=user_role, db=db,
+                                      include_archived=include_archived)
+    return negotiate(request, result, TODO_LIST)
+
+
+@router.get("/changes")
+async def get_changes(since: int = Query(0, ge=0), limit: int = Query(500, ge=1, le=5000),
+                      db: AsyncSession = Depends(get_db),
+                      user_id: int = Depends(get_user_id)) -> TaskChanges:
+    """
+    Endpoint to get the todos created, updated or deleted since the "since" cursor,
+    so clients can sync without fetching the whole list. Start with 0 and then send
+    the returned cursor, calling again while "has_more" is true.
+    
+    Returns:
+       Returns the changed todos, the deleted IDs and the next cursor.
+    """
+    result = await get_task_changes(user_id=user_id, since=since, limit=limit, db=db)
     return result
 
 
+@router.get("/stream")
+async def stream_tasks(user_id: int = Depends(get_user_id)) -> StreamingResponse:
+    """
+    Endpoint streaming the changes to the todos of the user as Server-Sent Events
+    ("task.created", "task.updated", "task.finished" and "task.deleted"),
+    so clients don't need to poll the list.
+    
+    Returns:
+       Returns an endless "text/event-stream" response.
+    """
+    return StreamingResponse(event_stream(user_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @router.get("/{task_id}")
-async def get_task_id(task_id: int, db: AsyncSession = Depends(get_db),
-                      user_id: int = Depends(get_user_id),
-                      user_role: str = Depends(get_user_role)) -> Union[list, dict]:
+async def get_task_id(task_id: int, include_archived: bool = False,
+                      db: AsyncSession = Depends(get_db), user_id: int = Depends(get_user_id),
+                      user_role: str = Depends(get_user_role)) -> list[TodoRead]:
     """
-    Endpoint to get a specific todo by ID.
+    Endpoint to get a specific todo by ID. Archived todos are only
+    found when "include_archived" is set.
     
     Returns:
        Returns the a list with the info of the todo.
     """
-    result = await get_todo_task_by_id(task_id=task_id, user_id=user_id, user_role=user_role, db=db)
-    return result
+    result = await get_todo_task_by_id(task_id=task_id, user_id=user_id, user_role=user_role,
+                                       db=db, include_archived=include_archived)
+    return typed_json(TODO_LIST, result)
 
 
-@router.post("/", status_code=201)
+@router.post("/", status_code=201, dependencies=IDEMPOTENT)
 async def add_todo(todo: TodoData, db: AsyncSession = Depends(get_db),
                    user_id: int = Depends(get_user_id)) -> ConnectionResponse:
     """
@@ -77,7 +117,7 @@ async def add_todo(todo: TodoData, db: AsyncSession = Depends(get_db),
     return result
 
 
-@router.put("/{task_id}", status_code=200)
+@router.put("/{task_id}", status_code=200, dependencies=IDEMPOTENT)
 async def update_todo(task_id: int, todo: TodoData,
                       db: AsyncSession = Depends(get_db), user_id: int = Depends(get_user_id),
                       user_role: str = Depends(get_user_role)) -> ConnectionResponse:
@@ -94,7 +134,7 @@ async def update_todo(task_id: int, todo: TodoData,
     return result
 
 
-@router.delete("/{task_id}", status_code=200)
+@router.delete("/{task_id}", status_code=200, dependencies=IDEMPOTENT)
 async def delete_todo(task_id: int,
                       db: AsyncSession = Depends(get_db), user_id: int = Depends(get_user_id),
                       user_role: str = Depends(get_user_role)) -> ConnectionResponse:
@@ -109,7 +149,7 @@ async def delete_todo(task_id: int,
     return result
 
 
-@router.put("/{task_id}/finish", status_code=200)
+@router.put("/{task_id}/finish", status_code=200, dependencies=IDEMPOTENT)
 async def mark_completed(task_id: int, finished: IsFinished,
                          db: AsyncSession = Depends(get_db), user_id: int = Depends(get_user_id),
                          user_role: str = Depends(get_user_role)) -> ConnectionResponse:
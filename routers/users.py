@@ -2,17 +2,26 @@
 users.py
 Routes are configured for the users endpoints.
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, Response
 from crud.users import create_new_user, get_existing_user, update_existing_user, \
-    delete_existing_user, get_all_existing_users, set_new_role
-from schemas import UserOutput, UserCreate, UserUpdate, NewRole
-from routers.db_functions import get_db, AsyncSession
+    delete_existing_user, get_all_existing_users, set_new_role, mark_user_deleted, \
+    get_deletion_status, purge_deleted_user
+from schemas import UserOutput, UserCreate, UserUpdate, NewRole, DeletionStatus, StatusResponse, \
+    UserInfo, USER_LIST
+from routers.db_functions import get_db, get_engine, AsyncSession, AsyncEngine
 from routers.tasks import get_user_id, get_user_role
+from ratelimit import limit_by_ip, limit_by_user
+from settings import purge_batch_size
+from responses import negotiate
+from idempotency import IDEMPOTENT, IdempotentRoute
 
-router = APIRouter()
+router = APIRouter(route_class=IdempotentRoute)
+USER_LIMIT = [Depends(limit_by_user('users'))]
+USER_WRITE = USER_LIMIT + IDEMPOTENT
 
 
-@router.post("/register", response_model=UserOutput)
+@router.post("/register", response_model=UserOutput,
+             dependencies=[Depends(limit_by_ip('register'))])
 async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """
     Endpoint to register a new user.
@@ -28,7 +37,7 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     }
 
 
-@router.get("/{id_}", response_model=UserOutput)
+@router.get("/{id_}", response_model=UserOutput, dependencies=[Depends(limit_by_ip('users'))])
 async def get_user(id_: int, db: AsyncSession = Depends(get_db)):
     """
     Endpoint to get info about user by ID.
@@ -43,7 +52,7 @@ async def get_user(id_: int, db: AsyncSession = Depends(get_db)):
     }
 
 
-@router.put("/{id_}", response_model=UserOutput)
+@router.put("/{id_}", response_model=UserOutput, dependencies=USER_WRITE)
 async def update_user(id_: int, user_data: UserUpdate, db: AsyncSession = Depends(get_db),
                       user_id: int = Depends(get_user_id), user_role: str = Depends(get_user_role)):
     """
@@ -60,20 +69,44 @@ async def update_user(id_: int, user_data: UserUpdate, db: AsyncSession = Depend
     }
 
 
-@router.delete("/{id_}")
-async def delete_user(id_: int, db: AsyncSession = Depends(get_db),
+@router.delete("/{id_}", response_model=StatusResponse, dependencies=USER_WRITE)
+async def delete_user(id_: int, response: Response,  # pylint: disable=R0913
+                      background_tasks: BackgroundTasks, background: bool = False,
+                      db: AsyncSession = Depends(get_db),
+                      engine: AsyncEngine = Depends(get_engine),
                       user_id: int = Depends(get_user_id), user_role: str = Depends(get_user_role)):
     """
-    Endpoint to delete an existing user.
+    Endpoint to delete an existing user. With "background=true" the user is only
+    marked as deleted and their todos are removed in batches after responding.
     
     Returns:
        Returns info about the transaction.
     """
-    deleted_user = await delete_existing_user(uid=id_, user_id=user_id, user_role=user_role, db=db)
+    if not background:
+        deleted_user = await delete_existing_user(uid=id_, user_id=user_id,
+                                                  user_role=user_role, db=db)
+        return deleted_user
+
+    deleted_user = await mark_user_deleted(uid=id_, user_id=user_id, user_role=user_role, db=db)
+    background_tasks.add_task(purge_deleted_user, id_, engine, purge_batch_size)
+    response.status_code = 202
     return deleted_user
 
 
-@router.patch("/{id_}")
+@router.get("/{id_}/deletion", response_model=DeletionStatus,
+            dependencies=[Depends(limit_by_ip('users'))])
+async def get_user_deletion(id_: int, db: AsyncSession = Depends(get_db)):
+    """
+    Endpoint to follow the progress of a background user deletion.
+    
+    Returns:
+       Returns the deletion status and the number of todos deleted and remaining.
+    """
+    deletion_status = await get_deletion_status(uid=id_, db=db)
+    return deletion_status
+
+
+@router.patch("/{id_}", response_model=StatusResponse, dependencies=USER_WRITE)
 async def set_role(id_: int, new_role: NewRole, db: AsyncSession = Depends(get_db),
                    user_role: str = Depends(get_user_role)):
     """
@@ -86,14 +119,15 @@ async def set_role(id_: int, new_role: NewRole, db: AsyncSession = Depends(get_d
     return user
 
 
-@router.get("/")
-async def get_all_users(db: AsyncSession = Depends(get_db),
+@router.get("/", response_model=list[UserInfo], dependencies=USER_LIMIT)
+async def get_all_users(request: Request, db: AsyncSession = Depends(get_db),
                         user_role: str = Depends(get_user_role)):
     """
-    Endpoint to get all existing users.
+    Endpoint to get all existing users. Sent as MessagePack
+    when requested with "Accept: application/msgpack".
     
     Returns:
        Returns all users from the Users table.
     """
     users = await get_all_existing_users(user_role=user_role, db=db)
-    return users
+    return negotiate(request, users, USER_LIST)
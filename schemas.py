@@ -3,10 +3,12 @@ schemas.py
 This module defines the schemas used 
 for data validation and serialization in the project.
 """
-from typing import Optional, Union
-from pydantic import BaseModel, field_validator, EmailStr, ConfigDict
+from typing import Any, Literal, Optional, Union
+from pydantic import BaseModel, field_validator, model_validator, EmailStr, ConfigDict, Field, \
+    TypeAdapter
 from models import UserRole
 from crypto import hash_password
+from settings import batch_max_operations
 
 
 class BasicResponse(BaseModel):
@@ -16,6 +18,14 @@ class BasicResponse(BaseModel):
     message: str
 
 
+class StatusResponse(BaseModel):
+    """
+    Model for a response containing the status and message of a transaction.
+    """
+    status: str
+    message: str
+
+
 class ConnectionResponse(BaseModel):
     """
     Model for a connection response containing status and message.
@@ -25,6 +35,20 @@ class ConnectionResponse(BaseModel):
     message: str
 
 
+class HealthStatus(BaseModel):
+    """
+    Model for the health and readiness probes, as of the last DB check.
+    """
+    ready: bool
+    database: bool
+    schema_version: Optional[str] = None
+    expected_schema_version: Optional[str] = None
+    checked_at: Optional[float] = None
+    age_seconds: Optional[float] = None
+    stale: bool
+    uptime_seconds: float
+
+
 class TodoData(BaseModel):
     """
     Model for a todo item containing title, description, 
@@ -35,6 +59,41 @@ class TodoData(BaseModel):
     is_finished: bool = False
 
 
+class TodoRead(BaseModel):
+    """
+    Model for a todo as returned by the endpoints getting todos.
+    """
+    id: int
+    title: str
+    description: str
+    is_finished: bool
+    creation_date: int
+
+
+class TodoChange(BaseModel):
+    """
+    Model for a todo created or updated, as returned by the changes feed.
+    """
+    id: int
+    title: str
+    description: str
+    is_finished: bool
+    creation_date: int
+    updated_at: int
+    revision: int
+
+
+class TaskChanges(BaseModel):
+    """
+    Model for the changes feed: the changed todos, the IDs of the deleted ones,
+    and the cursor to send as "since" on the next call.
+    """
+    changed: list[TodoChange]
+    deleted: list[int]
+    cursor: int
+    has_more: bool
+
+
 class IsFinished(BaseModel):
     """
     Model for a basic response containing true/false values.
@@ -90,6 +149,19 @@ class UserRead(BaseModel):
     model_config = ConfigDict(from_attributes=True, use_enum_values=True)
 
 
+class UserInfo(BaseModel):
+    """
+    Model for a user in the list of all users.
+    """
+    id: int
+    username: str
+    email: str
+    role: UserRole
+    creation_date: int
+
+    model_config = ConfigDict(use_enum_values=True)
+
+
 class UserOutput(BaseModel):
     """
     Model for the output when requesting user info with a message.
@@ -119,3 +191,70 @@ class NewRole(BaseModel):
     Model to update the user role.
     """
     role: UserRole
+
+
+class DeletionStatus(BaseModel):
+    """
+    Model for the progress of a background user deletion.
+    """
+    user_id: int
+    status: str
+    requested_at: int
+    finished_at: Optional[int] = None
+    deleted_todos: int
+    remaining_todos: int
+
+
+class BatchOperation(BaseModel):
+    """
+    Model for one operation of a batch request. "task_id" is required by every
+    operation but "create", "todo" by "create" and "update", and "is_finished" by "finish".
+    """
+    op: Literal['create', 'update', 'finish', 'delete', 'get']
+    task_id: Optional[int] = None
+    todo: Optional[TodoData] = None
+    is_finished: Optional[bool] = None
+
+    @model_validator(mode='after')
+    def check_fields(self) -> 'BatchOperation':
+        """
+        Function to check the fields required by the operation were supplied.
+        """
+        if self.op != 'create' and self.task_id is None:
+            raise ValueError(f'"task_id" is required for "{self.op}".')
+        if self.op in ('create', 'update') and self.todo is None:
+            raise ValueError(f'"todo" is required for "{self.op}".')
+        if self.op == 'finish' and self.is_finished is None:
+            raise ValueError('"is_finished" is required for "finish".')
+        return self
+
+
+class BatchRequest(BaseModel):
+    """
+    Model for a batch request. With "atomic", every operation runs in a single
+    transaction which is rolled back if any of them fails.
+    """
+    operations: list[BatchOperation] = Field(min_length=1, max_length=batch_max_operations)
+    atomic: bool = False
+
+
+class BatchResult(BaseModel):
+    """
+    Model for the result of one operation of a batch request.
+    """
+    status_code: int
+    body: Any
+
+
+class BatchResponse(BaseModel):
+    """
+    Model for the response of a batch request.
+    """
+    committed: bool
+    results: list[BatchResult]
+
+
+# Adapters validating and encoding whole lists in a single pydantic-core call
+# (see responses.typed_json).
+TODO_LIST = TypeAdapter(list[TodoRead])
+USER_LIST = TypeAdapter(list[UserInfo])
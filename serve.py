@@ -0,0 +1,63 @@
+"""
+serve.py
+Production entry point for the API. It runs the app in "server_workers" uvicorn
+worker processes, with uvloop and httptools when they are installed (falling back
+to asyncio and h11), and the keep-alive, backlog and preload options of settings.py.
+On SIGTERM, the in-flight requests get "server_graceful_timeout" seconds to finish.
+
+Usage:
+    python serve.py
+"""
+import importlib
+import importlib.util
+import uvicorn
+from settings import server_host, server_port, server_workers, server_keep_alive, \
+    server_backlog, server_preload, server_graceful_timeout
+
+APP = "app:app"
+
+
+def is_installed(module: str) -> bool:
+    """
+    Function to check whether an optional module can be imported.
+    """
+    return importlib.util.find_spec(module) is not None
+
+
+def server_options() -> dict:
+    """
+    Function to get the options of the uvicorn server.
+    """
+    return {
+        "host": server_host,
+        "port": server_port,
+        "workers": server_workers,
+        "loop": "uvloop" if is_installed("uvloop") else "asyncio",
+        "http": "httptools" if is_installed("httptools") else "h11",
+        "timeout_keep_alive": server_keep_alive,
+        "backlog": server_backlog,
+        "timeout_graceful_shutdown": server_graceful_timeout,
+    }
+
+
+def serve():
+    """
+    Function to run the server until it is stopped.
+
+    Uvicorn starts its workers as new processes which import the app themselves,
+    so it can't be shared with them. With "server_preload", the app is imported
+    first anyway, so a broken configuration fails before any worker starts; a
+    single worker then runs that same app instead of importing it again.
+    """
+    options = server_options()
+    app = APP
+    if server_preload:
+        module_name, _, attribute = APP.partition(":")
+        preloaded = getattr(importlib.import_module(module_name), attribute)
+        if options["workers"] == 1:
+            app = preloaded
+    uvicorn.run(app, **options)
+
+
+if __name__ == "__main__":
+    serve()
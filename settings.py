@@ -3,6 +3,7 @@ settings.py
 Module for parsing all required
 details from the .env file
 """
+import os
 from dotenv import dotenv_values
 from crypto import hash_password, generate_random_string
 
@@ -21,9 +22,71 @@ admin_email = config.get('admin_email') or 'admin@admin.com'
 admin_password = config.get('admin_password') or generate_random_string(10)
 admin_hashed_password = hash_password(admin_password)
 
-connection_string = f"postgresql+asyncpg://{user}:{password}@{host}/{database}"
-test_connection_string = (
-    f"postgresql+asyncpg://{test_user}:{test_password}@{host}:5433/{test_database}"
-)
+# "postgres" or "sqlite". SQLite keeps the DB in the "sqlite_path" file (or in memory
+# with ":memory:"), and the test DB in "test_sqlite_path" (in memory by default).
+db_backend = config.get('db_backend') or 'postgres'
+sqlite_path = config.get('sqlite_path') or 'todo.db'
+test_sqlite_path = config.get('test_sqlite_path') or ':memory:'
+
+if db_backend == 'sqlite':
+    connection_string = f"sqlite+aiosqlite:///{sqlite_path}"
+    test_connection_string = f"sqlite+aiosqlite:///{test_sqlite_path}"
+else:
+    connection_string = f"postgresql+asyncpg://{user}:{password}@{host}/{database}"
+    test_connection_string = (
+        f"postgresql+asyncpg://{test_user}:{test_password}@{host}:5433/{test_database}"
+    )
 
 SECRET_KEY = config.get('secret_key')
+
+# Connections kept open by the pool of each worker, and how many of them are
+# opened (and primed) on startup.
+db_pool_size = int(config.get('db_pool_size') or 10)
+db_max_overflow = int(config.get('db_max_overflow') or 10)
+db_warm_connections = int(config.get('db_warm_connections') or 5)
+
+# Rate limits are written as "<burst>/<seconds>", e.g. "5/60" allows a burst of
+# five requests which refills completely over one minute.
+rate_limit_backend = config.get('rate_limit_backend') or 'memory'
+rate_limits = {
+    'login': config.get('rate_limit_login') or '5/60',
+    'register': config.get('rate_limit_register') or '10/60',
+    'tasks': config.get('rate_limit_tasks') or '120/60',
+    'users': config.get('rate_limit_users') or '60/60',
+}
+
+revocation_refresh_seconds = float(config.get('revocation_refresh_seconds') or 5)
+
+purge_batch_size = int(config.get('purge_batch_size') or 1000)
+
+todo_partitions = int(config.get('todo_partitions') or 16)
+
+archive_after_days = float(config.get('archive_after_days') or 30)
+archive_batch_size = int(config.get('archive_batch_size') or 1000)
+archive_interval_seconds = float(config.get('archive_interval_seconds') or 3600)
+
+event_backend = config.get('event_backend') or 'memory'
+
+batch_max_operations = int(config.get('batch_max_operations') or 100)
+
+# JSON and MessagePack responses smaller than this (in bytes) are sent uncompressed.
+compression_minimum_size = int(config.get('compression_minimum_size') or 1024)
+
+idempotency_ttl_seconds = int(config.get('idempotency_ttl_seconds') or 86400)
+idempotency_cache_size = int(config.get('idempotency_cache_size') or 10000)
+idempotency_purge_seconds = float(config.get('idempotency_purge_seconds') or 3600)
+
+# Options of the production server (serve.py).
+server_host = config.get('server_host') or '0.0.0.0'
+server_port = int(config.get('server_port') or 8000)
+server_workers = int(config.get('server_workers') or os.cpu_count() or 1)
+server_keep_alive = int(config.get('server_keep_alive') or 5)
+server_backlog = int(config.get('server_backlog') or 2048)
+server_preload = (config.get('server_preload') or 'false').lower() in ('1', 'true', 'yes')
+# Seconds given to the in-flight requests to finish on shutdown (e.g. on SIGTERM).
+server_graceful_timeout = int(config.get('server_graceful_timeout') or 30)
+
+# The health probes are answered from a DB check run every "health_probe_seconds";
+# a result older than "health_stale_seconds" makes the worker not ready.
+health_probe_seconds = float(config.get('health_probe_seconds') or 5)
+health_stale_seconds = float(config.get('health_stale_seconds') or health_probe_seconds * 3)
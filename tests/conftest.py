@@ -4,6 +4,8 @@ The main config file to set up sessions and other parameters for the test_app.py
 """
 import asyncio
 import pytest_asyncio
+from alembic import command
+from alembic.config import Config
 from httpx import AsyncClient, ASGITransport
 from db import test_engine, test_async_session
 from app import app
@@ -39,6 +41,26 @@ def event_loop():
     loop.close()
 
 
+def run_migrations(connection):
+    """
+    Function to migrate the test DB through the given connection.
+    """
+    alembic_config = Config("alembic.ini")
+    alembic_config.attributes['connection'] = connection
+    command.upgrade(alembic_config, "head")
+
+
+@pytest_asyncio.fixture(scope="session", autouse=True)
+async def test_db():
+    """
+    Migrates the in-memory SQLite test DB, which starts empty on every run
+    (the other test DBs are migrated with "alembic upgrade head").
+    """
+    if test_engine.url.database == ':memory:':
+        async with test_engine.begin() as conn:
+            await conn.run_sync(run_migrations)
+
+
 @pytest_asyncio.fixture(scope="session")
 async def test_client():
     """
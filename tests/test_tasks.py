@@ -2,9 +2,19 @@
 test_tasks.py
 The module containing all task-related tests for the FastAPI application.
 """
+import msgpack
 from fastapi.testclient import TestClient
 from conftest import app
 from helpers import get_new_token, ADMIN_TOKEN
+from db import test_engine
+from crypto import generate_random_string
+from partitions import ensure_partitions
+from crud.tasks import archive_finished_tasks
+from crud.warmup import warm_up_pool
+from events import hub, event_stream
+from idempotency import idempotency_store
+from serve import server_options
+from health import prober
 
 sync_client = TestClient(app)
 BASE_URL = "/api/v1/tasks"
@@ -45,6 +55,16 @@ def test_test_route():
     assert response.json() == {"message": "This is another test route."}
 
 
+def test_server_options():
+    """
+    Testing the options of the production server.
+    """
+    options = server_options()
+    assert options["workers"] >= 1
+    assert options["loop"] in ("uvloop", "asyncio")
+    assert options["http"] in ("httptools", "h11")
+
+
 async def test_db_test_connection(test_client) -> None:
     """
     Testing the testing of db connection for the app.
@@ -278,3 +298,232 @@ async def test_finish(test_client) -> None:
     assert missing_response.status_code == 400
     assert missing_response.json() == {"detail": "Task with ID 131313 does not exist."}
     assert missing_no_auth_response.status_code == 401
+
+
+async def test_ensure_partitions() -> None:
+    """
+    Testing the maintenance command creating the "todos" partitions.
+    """
+    partitions = await ensure_partitions(test_engine, modulus=4)
+    assert list(partitions) == ["todos_p0", "todos_p1", "todos_p2", "todos_p3"]
+    assert all(rows >= 0 for rows in partitions.values())
+
+
+async def test_archive_finished_tasks(test_client) -> None:
+    """
+    Testing moving finished tasks to the archive and reading them back.
+    """
+    todo_data = {"title": "Testing_archive",
+                 "description": "Description_archive", "is_finished": True}
+    task_id, auth_token = await get_a_task_id(test_client, todo_data)
+    headers = {
+        "Authorization": f"Bearer {auth_token}"
+    }
+    assert await archive_finished_tasks(test_engine, older_than=0, batch_size=2) >= 1
+
+    response = await test_client.get(f"{BASE_URL}/{task_id}", headers=headers)
+    assert response.status_code == 400
+    response = await test_client.get(f"{BASE_URL}/{task_id}?include_archived=true",
+                                     headers=headers)
+    assert response.status_code == 200
+    assert response.json()[0]["title"] == "Testing_archive"
+
+    response = await test_client.get(f"{BASE_URL}/?include_archived=true", headers=headers)
+    assert task_id in [task["id"] for task in response.json()]
+
+
+async def test_get_changes(test_client) -> None:
+    """
+    Testing the changes feed used to sync the tasks.
+    """
+    todo_data = {"title": "Testing_changes", "description": "Description_changes"}
+    task_id, auth_token = await get_a_task_id(test_client, todo_data)
+    headers = {
+        "Authorization": f"Bearer {auth_token}"
+    }
+    response = await test_client.get(f"{BASE_URL}/changes?since=0", headers=headers)
+    assert response.status_code == 200
+    assert task_id in [task["id"] for task in response.json()["changed"]]
+    cursor = response.json()["cursor"]
+
+    # Nothing changed since the last cursor.
+    response = await test_client.get(f"{BASE_URL}/changes?since={cursor}", headers=headers)
+    assert response.json()["changed"] == []
+    assert response.json()["cursor"] == cursor
+
+    await test_client.put(f"{BASE_URL}/{task_id}/finish", json={"is_finished": True},
+                          headers=headers)
+    response = await test_client.get(f"{BASE_URL}/changes?since={cursor}", headers=headers)
+    assert [task["id"] for task in response.json()["changed"]] == [task_id]
+    assert response.json()["changed"][0]["is_finished"] is True
+    cursor = response.json()["cursor"]
+
+    await test_client.delete(f"{BASE_URL}/{task_id}", headers=headers)
+    response = await test_client.get(f"{BASE_URL}/changes?since={cursor}&limit=1",
+                                     headers=headers)
+    assert response.json()["changed"] == []
+    assert response.json()["deleted"] == [task_id]
+    assert response.json()["has_more"] is False
+
+
+async def test_task_events(test_client) -> None:
+    """
+    Testing that task changes are pushed to the clients of their user.
+    """
+    auth_token = await get_new_token(test_client,
+                                     base_url=USER_API_URL, main_test_user=main_test_user)
+    user_id = main_test_user['user']['id']
+    stream = event_stream(user_id, heartbeat=0.01)
+    assert await anext(stream) == ": keep-alive\n\n"
+
+    headers = {
+        "Authorization": f"Bearer {auth_token}"
+    }
+    todo_data = {"title": "Testing_events", "description": "Description_events"}
+    response = await test_client.post(f"{BASE_URL}/", json=todo_data, headers=headers)
+    task_id = response.json()['task_id']
+    await test_client.delete(f"{BASE_URL}/{task_id}", headers=headers)
+
+    assert (await anext(stream)).startswith("event: task.created\ndata: ")
+    assert await anext(stream) == f'event: task.deleted\ndata: {{"id": {task_id}}}\n\n'
+    await stream.aclose()
+    assert user_id not in hub.subscribers
+
+
+async def test_batch(test_client) -> None:
+    """
+    Testing running several operations in a single batch request.
+    """
+    todo_data = {"title": "Testing_batch", "description": "Description_batch"}
+    task_id, auth_token = await get_a_task_id(test_client, todo_data)
+    headers = {
+        "Authorization": f"Bearer {auth_token}"
+    }
+    batch = {"operations": [
+        {"op": "create", "todo": todo_data},
+        {"op": "finish", "task_id": task_id, "is_finished": True},
+        {"op": "get", "task_id": 131313},
+        {"op": "get", "task_id": task_id}
+    ]}
+    response = await test_client.post("/api/v1/batch", json=batch, headers=headers)
+    results = response.json()["results"]
+    assert response.status_code == 200
+    assert response.json()["committed"] is True
+    assert [result["status_code"] for result in results] == [201, 200, 400, 200]
+    assert results[3]["body"][0]["is_finished"] is True
+
+    # An atomic batch is rolled back when one of the operations fails.
+    batch = {"atomic": True, "operations": [
+        {"op": "delete", "task_id": task_id},
+        {"op": "update", "task_id": 131313, "todo": todo_data},
+        {"op": "get", "task_id": task_id}
+    ]}
+    response = await test_client.post("/api/v1/batch", json=batch, headers=headers)
+    assert response.json()["committed"] is False
+    assert [result["status_code"] for result in response.json()["results"]] == [200, 400, 424]
+    response = await test_client.get(f"{BASE_URL}/{task_id}", headers=headers)
+    assert response.status_code == 200
+
+    bad_batch = {"operations": [{"op": "delete"}]}
+    response = await test_client.post("/api/v1/batch", json=bad_batch, headers=headers)
+    assert response.status_code == 422
+    no_auth_response = await test_client.post("/api/v1/batch", json=batch)
+    assert no_auth_response.status_code == 401
+
+
+async def test_list_formats(test_client) -> None:
+    """
+    Testing getting the tasks as MessagePack and compressed.
+    """
+    todo_data = {"title": "Testing_list_formats", "description": "Description" * 20}
+    _, auth_token = await get_a_task_id(test_client, todo_data)
+    headers = {
+        "Authorization": f"Bearer {auth_token}"
+    }
+    for _ in range(5):
+        await test_client.post(f"{BASE_URL}/", json=todo_data, headers=headers)
+    identity_headers = {**headers, "Accept-Encoding": "identity"}
+    response = await test_client.get(f"{BASE_URL}/", headers=identity_headers)
+    assert response.headers["content-type"] == "application/json"
+    assert "content-encoding" not in response.headers
+
+    msgpack_headers = {**headers, "Accept": "application/msgpack"}
+    msgpack_response = await test_client.get(f"{BASE_URL}/", headers=msgpack_headers)
+    assert msgpack_response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(msgpack_response.content) == response.json()
+
+    for encoding in ("gzip", "br"):
+        compressed_headers = {**headers, "Accept-Encoding": encoding}
+        compressed = await test_client.get(f"{BASE_URL}/", headers=compressed_headers)
+        assert compressed.headers["content-encoding"] == encoding
+        assert compressed.json() == response.json()
+
+    # Small responses are not worth compressing.
+    compressed_headers = {**headers, "Accept-Encoding": "br"}
+    response = await test_client.get(f"{BASE_URL}/131313", headers=compressed_headers)
+    assert "content-encoding" not in response.headers
+
+
+async def test_idempotency_key(test_client) -> None:
+    """
+    Testing retrying writes with an Idempotency-Key.
+    """
+    auth_token = await get_new_token(test_client,
+                                     base_url=USER_API_URL, main_test_user=main_test_user)
+    key = generate_random_string(16)
+    headers = {
+        "Authorization": f"Bearer {auth_token}",
+        "Idempotency-Key": key
+    }
+    todo_data = {"title": "Testing_idempotency", "description": "Description_idempotency"}
+    response = await test_client.post(f"{BASE_URL}/", json=todo_data, headers=headers)
+    assert response.status_code == 201
+    assert "idempotent-replayed" not in response.headers
+
+    # The retry gets the same response, from the cache and then from the DB.
+    retry = await test_client.post(f"{BASE_URL}/", json=todo_data, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == response.json()
+    idempotency_store.responses.clear()
+    retry = await test_client.post(f"{BASE_URL}/", json=todo_data, headers=headers)
+    assert retry.json() == response.json()
+
+    other_todo = {"title": "Testing_idempotency", "description": "Another description"}
+    reused = await test_client.post(f"{BASE_URL}/", json=other_todo, headers=headers)
+    assert reused.status_code == 422
+
+    # Client errors are stored as well.
+    headers["Idempotency-Key"] = generate_random_string(16)
+    response = await test_client.delete(f"{BASE_URL}/131313", headers=headers)
+    retry = await test_client.delete(f"{BASE_URL}/131313", headers=headers)
+    assert response.status_code == retry.status_code == 400
+    assert retry.json() == response.json()
+
+
+async def test_warm_up_pool() -> None:
+    """
+    Testing opening and priming the pooled connections on startup.
+    """
+    assert await warm_up_pool(test_engine, 3) >= 3
+    assert await warm_up_pool(test_engine, 1000) <= test_engine.pool.size()
+
+
+async def test_health_probes(test_client) -> None:
+    """
+    Testing the health and readiness probes.
+    """
+    await prober.probe(test_engine)
+    response = await test_client.get("/api/v1/healthz")
+    assert response.status_code == 200
+    assert response.json()["database"] is True
+    response = await test_client.get("/api/v1/readyz")
+    assert response.status_code == 200
+    assert response.json()["schema_version"] == response.json()["expected_schema_version"]
+
+    # A probe result too old is not trusted.
+    prober.checked_at -= prober.stale_after + 1
+    response = await test_client.get("/api/v1/readyz")
+    assert response.status_code == 503
+    assert response.json()["stale"] is True
+    assert (await test_client.get("/api/v1/healthz")).status_code == 200
@@ -2,8 +2,11 @@
 test_users.py
 The module containing all user-related tests for the FastAPI application.
 """
+import msgpack
 from helpers import generate_creds, login, get_new_token, ADMIN_TOKEN, get_new_user_id
-from schemas import UserOutput
+from schemas import UserOutput, UserInfo
+from db import test_engine
+from ratelimit import RULES, RateLimitRule, consume_shared
 
 BASE_URL = "/api/v1/users"
 main_test_user = {}
@@ -87,15 +90,26 @@ async def test_change_user_role(test_client) -> None:
     response = await test_client.patch(f"{BASE_URL}/131313", json=role_data, headers=headers)
     assert response.status_code == 400
 
-    # Testing with the admin user.
+    # Testing with the admin user, on a separate user so the main one keeps its role.
+    promoted_user = {}
+    promoted_token = await get_new_token(test_client, base_url=BASE_URL,
+                                         main_test_user=promoted_user)
     headers = {
         "Authorization": f"Bearer {ADMIN_TOKEN}"
     }
-    response = await test_client.patch(f"{BASE_URL}/{user_id}", json=role_data, headers=headers)
+    response = await test_client.patch(f"{BASE_URL}/{promoted_user['user']['id']}",
+                                       json=role_data, headers=headers)
     assert response.status_code == 200
     assert "status" in response.json()
     assert "message" in response.json()
 
+    # Tokens issued before the role change are revoked.
+    headers = {
+        "Authorization": f"Bearer {promoted_token}"
+    }
+    response = await test_client.get(f"{BASE_URL}/", headers=headers)
+    assert response.status_code == 401
+
 
 async def test_get_all_users(test_client) -> None:
     """
@@ -117,6 +131,12 @@ async def test_get_all_users(test_client) -> None:
     }
     response = await test_client.get(f"{BASE_URL}/", headers=headers)
     assert response.status_code == 200
+    assert set(response.json()[0]) == set(UserInfo.model_fields)
+
+    headers["Accept"] = "application/msgpack"
+    msgpack_response = await test_client.get(f"{BASE_URL}/", headers=headers)
+    assert msgpack_response.status_code == 200
+    assert msgpack.unpackb(msgpack_response.content)[0] == response.json()[0]
 
 
 async def test_delete_user(test_client) -> None:
@@ -150,3 +170,72 @@ async def test_delete_user(test_client) -> None:
     response = await test_client.delete(f"{BASE_URL}/{user_id}", headers=headers)
     assert response.status_code == 200
     assert isinstance(response.json(), dict)
+
+
+async def test_delete_user_in_background(test_client) -> None:
+    """
+    Testing deleting a user with many todos in the background.
+    """
+    new_user = {}
+    auth_token = await get_new_token(test_client, base_url=BASE_URL, main_test_user=new_user)
+    user_id = new_user['user']['id']
+    headers = {
+        "Authorization": f"Bearer {auth_token}"
+    }
+    todo_data = {"title": "Purged", "description": "Deleted in the background"}
+    for _ in range(3):
+        await test_client.post("/api/v1/tasks/", json=todo_data, headers=headers)
+
+    response = await test_client.delete(f"{BASE_URL}/{user_id}?background=true", headers=headers)
+    assert response.status_code == 202
+    assert response.json()["status"] == "accepted"
+
+    response = await test_client.get(f"{BASE_URL}/{user_id}/deletion")
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert response.json()["deleted_todos"] == 3
+    assert response.json()["remaining_todos"] == 0
+
+    no_deletion = await test_client.get(f"{BASE_URL}/131313/deletion")
+    assert no_deletion.status_code == 404
+
+
+async def test_logout(test_client) -> None:
+    """
+    Testing that a token can no longer be used after logging out.
+    """
+    auth_token = await get_new_token(test_client, base_url=BASE_URL, main_test_user={})
+    headers = {
+        "Authorization": f"Bearer {auth_token}"
+    }
+    response = await test_client.post("/api/v1/logout", headers=headers)
+    assert response.status_code == 200
+    assert "message" in response.json()
+
+    response = await test_client.post("/api/v1/logout", headers=headers)
+    assert response.status_code == 401
+    response = await test_client.get("/api/v1/tasks/", headers=headers)
+    assert response.status_code == 401
+
+
+async def test_login_rate_limit(test_client) -> None:
+    """
+    Testing that repeated login attempts from one IP are rejected with Retry-After.
+    """
+    credentials = {"username": "no_such_user", "password": "wrong"}
+    responses = [await test_client.post("/api/v1/login", data=credentials)
+                 for _ in range(RULES['login'].burst + 1)]
+    assert all(response.status_code == 403 for response in responses[:-1])
+    assert responses[-1].status_code == 429
+    assert int(responses[-1].headers["Retry-After"]) > 0
+
+
+async def test_shared_rate_limit_buckets() -> None:
+    """
+    Testing the Postgres-backed buckets used when workers share their limits.
+    """
+    key, _ = generate_creds()
+    rule = RateLimitRule(burst=3, period=60)
+    waits = [await consume_shared(test_engine, key, rule) for _ in range(4)]
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert 0 < waits[3] <= rule.interval